@@ -1,18 +1,21 @@
 import json
+from xml.etree.ElementTree import ParseError
 
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import path
 from django.utils.translation import gettext as _
+from django.utils.translation import ngettext
 
 import requests
 
-from .exports import export_resource
-from .imports import import_resource
+from .cache import render_resource_bibtex, render_resource_json, render_resource_xml
+from .copies import create_new_versions
+from .imports import fetch_data, get_http_session, import_resource, import_urls
 from .models import (
     AlternateIdentifier,
     Contributor,
@@ -34,8 +37,6 @@ from .models import (
     Subject,
     Title,
 )
-from .renderers import XMLRenderer
-from .utils import render_bibtex
 
 # Forms
 
@@ -205,17 +206,29 @@ class ImportForm(forms.Form):
                 raise ValidationError(_('Please provide a valid JSON.')) from e
 
         elif cleaned_data.get('url'):
-            response = requests.get(cleaned_data['url'])
-            response.raise_for_status()
-
             try:
-                cleaned_data['data'] = response.json()
-            except json.JSONDecodeError as e:
-                raise ValidationError(_('Please provide a valid JSON.')) from e
+                with get_http_session(1) as http_session:
+                    cleaned_data['data'] = fetch_data(http_session, cleaned_data['url'])
+            except (ValueError, ParseError) as e:
+                # ValueError includes JSONDecodeError and XML documents without a resource
+                raise ValidationError(_('Please provide a valid JSON or XML.')) from e
+            except requests.RequestException as e:
+                raise ValidationError(_('The URL could not be fetched.')) from e
 
         else:
             raise ValidationError(_('Please provide a file OR a URL.'))
 
+        # e.g. a JSON list or an XML document without a resource element
+        if not isinstance(cleaned_data['data'], dict):
+            raise ValidationError(_('Please provide a DataCite resource.'))
+
+
+class ImportURLsForm(forms.Form):
+    urls = forms.CharField(widget=forms.Textarea, help_text=_('One URL or DOI per line.'))
+
+    def clean_urls(self):
+        return list(dict.fromkeys(url.strip() for url in self.cleaned_data['urls'].splitlines() if url.strip()))
+
 
 # Inlines
 
@@ -338,8 +351,10 @@ class ResourceAdmin(admin.ModelAdmin):
     exclude = ('geo_locations', 'subjects')
     list_display = ('identifier', 'title', 'resource_type_general', 'version')
     list_filter = ('resource_type_general', 'publisher', 'publication_year', 'version')
+    list_select_related = ('identifier', )
     autocomplete_fields = ('identifier', )
     ordering = ('identifier__identifier', )
+    actions = ('create_new_versions', )
 
     class Media:
         css = {
@@ -347,7 +362,7 @@ class ResourceAdmin(admin.ModelAdmin):
         }
 
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('creator_set__name')
+        return super().get_queryset(request).with_title().prefetch_related('creator_set__name')
 
     def get_urls(self):
         return [
@@ -357,6 +372,9 @@ class ResourceAdmin(admin.ModelAdmin):
             path('import/',
                  self.admin_site.admin_view(self.datacite_resource_import),
                  name='datacite_resource_import'),
+            path('import-urls/',
+                 self.admin_site.admin_view(self.datacite_resource_import_urls),
+                 name='datacite_resource_import_urls'),
             path('<int:pk>/import/',
                  self.admin_site.admin_view(self.datacite_resource_import),
                  name='datacite_resource_import'),
@@ -376,15 +394,15 @@ class ResourceAdmin(admin.ModelAdmin):
         resource = get_object_or_404(Resource, id=pk)
 
         if format == 'json':
-            resource_json = json.dumps(export_resource(resource), indent=2)
+            resource_json = render_resource_json(resource)
             response = HttpResponse(resource_json, content_type="application/json")
             response['Content-Disposition'] = f'filename="{resource.identifier}.json"'
         elif format == 'xml':
-            resource_xml = XMLRenderer().render(export_resource(resource))
+            resource_xml = render_resource_xml(resource)
             response = HttpResponse(resource_xml, content_type="application/xml")
             response['Content-Disposition'] = f'filename="{resource.identifier}.xml"'
         elif format == 'bibtex':
-            resource_bibtex = render_bibtex(resource)
+            resource_bibtex = render_resource_bibtex(resource)
             response = HttpResponse(resource_bibtex, content_type='application/x-bibtex')
             response['Content-Disposition'] = f'filename="{resource.identifier}.bib"'
         else:
@@ -415,6 +433,25 @@ class ResourceAdmin(admin.ModelAdmin):
             'form': form
         })
 
+    def datacite_resource_import_urls(self, request):
+        form = ImportURLsForm(request.POST or None)
+        results = None
+
+        if request.method == 'POST':
+            if '_back' in request.POST:
+                return redirect('admin:datacite_resource_changelist')
+
+            elif '_send' in request.POST and form.is_valid():
+                results = [
+                    (url, None, result) if isinstance(result, Exception) else (url, result, None)
+                    for url, result in import_urls(form.cleaned_data['urls'])
+                ]
+
+        return render(request, 'admin/datacite/resource/import_urls.html', context={
+            'form': form,
+            'results': results
+        })
+
     def datacite_resource_copy(self, request, pk=None):
         resource = get_object_or_404(Resource, id=pk)
 
@@ -436,11 +473,29 @@ class ResourceAdmin(admin.ModelAdmin):
                 return redirect('admin:datacite_resource_change', object_id=pk)
 
             elif '_send' in request.POST:
-                resource_copy = resource.create_new_version()
+                try:
+                    resource_copy = resource.create_new_version()
+                except ValidationError as e:
+                    self.message_user(request, ' '.join(e.messages), messages.ERROR)
+                    return redirect('admin:datacite_resource_change', object_id=pk)
+
                 return redirect('admin:datacite_resource_change', object_id=resource_copy.id)
 
         return render(request, 'admin/datacite/resource/create_new_version.html')
 
+    @admin.action(description=_('Create new versions of the selected resources'))
+    def create_new_versions(self, request, queryset):
+        try:
+            resource_copies = create_new_versions(queryset.select_related('identifier').order_by('pk'))
+        except ValidationError as e:
+            self.message_user(request, ' '.join(e.messages), messages.ERROR)
+        else:
+            self.message_user(request, ngettext(
+                '%(count)d new version was created.',
+                '%(count)d new versions were created.',
+                len(resource_copies)
+            ) % {'count': len(resource_copies)}, messages.SUCCESS)
+
     def datacite_resource_validate(self, request, pk=None):
         resource = get_object_or_404(Resource, id=pk)
         return render(request, 'admin/datacite/resource/validate.html', {
@@ -5,3 +5,6 @@ class DataciteConfig(AppConfig):
     name = 'django_datacite'
     label = 'datacite'
     verbose_name = 'Datacite'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,58 @@
+import json
+
+from django.core.cache import caches
+
+from .exports import export_resource
+from .managers import prefetch_for_export
+from .renderers import XMLRenderer
+from .utils import get_settings, render_bibtex
+
+FORMATS = ('json', 'xml', 'bibtex')
+
+
+def get_cache():
+    cache_alias = get_settings('DATACITE_CACHE')
+    if cache_alias is not None:
+        return caches[cache_alias]
+
+
+def get_cache_key(resource_id, format):
+    return f'datacite:{format}:{resource_id}'
+
+
+def get_cached(resource, format, render_func):
+    cache = get_cache()
+    if cache is None:
+        prefetch_for_export([resource])
+        return render_func(resource)
+
+    # the rendered output is stored together with the revision of the resource,
+    # a stored value of an older revision is never returned
+    cache_key = get_cache_key(resource.pk, format)
+    cache_value = cache.get(cache_key)
+    if cache_value is not None and cache_value[0] == resource.revision:
+        return cache_value[1]
+
+    # the relations are only fetched if the rendering is not cached
+    prefetch_for_export([resource])
+    value = render_func(resource)
+    cache.set(cache_key, (resource.revision, value), get_settings('DATACITE_CACHE_TIMEOUT'))
+    return value
+
+
+def delete_cached(resource_ids):
+    cache = get_cache()
+    if cache is not None:
+        cache.delete_many([get_cache_key(resource_id, format) for resource_id in resource_ids for format in FORMATS])
+
+
+def render_resource_json(resource):
+    return get_cached(resource, 'json', lambda resource: json.dumps(export_resource(resource), indent=2))
+
+
+def render_resource_xml(resource):
+    return get_cached(resource, 'xml', lambda resource: XMLRenderer().render(export_resource(resource)))
+
+
+def render_resource_bibtex(resource):
+    return get_cached(resource, 'bibtex', render_bibtex)
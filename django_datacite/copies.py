@@ -0,0 +1,197 @@
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+from django.utils.translation import gettext as _
+
+from .models import (
+    AlternateIdentifier,
+    Contributor,
+    Creator,
+    Date,
+    Description,
+    FundingReference,
+    Identifier,
+    RelatedIdentifier,
+    RelatedItem,
+    Resource,
+    Rights,
+    Title,
+)
+from .signals import mark_citations_changed, mark_resources_changed
+from .utils import get_settings, update_version
+
+# the fields of the resource which are copied, the identifier is not copied
+RESOURCE_COPY_FIELDS = (
+    'publisher',
+    'publication_year',
+    'resource_type',
+    'resource_type_general',
+    'language',
+    'size',
+    'format',
+    'version',
+    'cite_publisher',
+    'cite_resource_type_general',
+    'cite_version'
+)
+
+# the tables with a foreign key to the resource, which are copied row by row
+RESOURCE_COPY_MODELS = (
+    Title,
+    Description,
+    Creator,
+    Contributor,
+    Date,
+    AlternateIdentifier,
+    RelatedIdentifier,
+    Rights,
+    FundingReference,
+    RelatedItem
+)
+
+# the many to many relations of the resource, only the rows of the through table are copied
+RESOURCE_COPY_THROUGH_MODELS = (
+    Resource.subjects.through,
+    Resource.geo_locations.through
+)
+
+
+def copy_resources(resources, values=None):
+    # copy the resources and their related rows with a constant number of queries, every table is
+    # read and written once, values can contain extra field values (e.g. the identifier) for every copy
+    with transaction.atomic():
+        resource_copies = [
+            Resource(**{
+                **{field_name: getattr(resource, field_name) for field_name in RESOURCE_COPY_FIELDS},
+                **(values[index] if values else {})
+            })
+            for index, resource in enumerate(resources)
+        ]
+        create_instances(Resource, resource_copies)
+
+        copy_ids = {
+            resource.pk: resource_copy.pk for resource, resource_copy in zip(resources, resource_copies)
+        }
+
+        for model in RESOURCE_COPY_MODELS + RESOURCE_COPY_THROUGH_MODELS:
+            model.objects.bulk_create([
+                model(**get_copy_values(instance), resource_id=copy_ids[instance.resource_id])
+                for instance in model.objects.filter(resource__in=copy_ids).order_by('pk')
+            ])
+
+        # bulk_create does not send signals
+        mark_resources_changed(copy_ids.values())
+
+        # the citations are rendered once, when the transaction is committed
+        mark_citations_changed(copy_ids.values())
+
+    return resource_copies
+
+
+def create_new_version(resource):
+    return create_new_versions([resource])[0]
+
+
+def create_new_versions(resources):
+    # create a new version of every resource with a constant number of queries, the new identifiers
+    # are computed in advance and a ValidationError is raised if one of them exists already
+    resources = list(resources)
+    models.prefetch_related_objects(resources, 'identifier')
+
+    identifiers = [
+        Identifier(
+            identifier=update_version(resource.identifier.identifier),
+            identifier_type=resource.identifier.identifier_type
+        ) if resource.identifier is not None else None
+        for resource in resources
+    ]
+
+    with transaction.atomic():
+        check_identifiers([identifier for identifier in identifiers if identifier is not None])
+        create_instances(Identifier, [identifier for identifier in identifiers if identifier is not None])
+
+        # resources without an identifier are only copied
+        values = []
+        for resource, identifier in zip(resources, identifiers):
+            if identifier is None:
+                values.append({})
+            elif resource.version:
+                values.append({'identifier': identifier, 'version': update_version(resource.version)})
+            else:
+                values.append({'identifier': identifier})
+
+        resource_copies = copy_resources(resources, values)
+
+        versioned = [
+            (resource, resource_copy) for resource, resource_copy in zip(resources, resource_copies)
+            if resource_copy.identifier is not None
+        ]
+        if versioned:
+            # remove any old IsNewVersionOf related identifier for the new resources
+            RelatedIdentifier.objects.filter(
+                resource__in=[resource_copy for resource, resource_copy in versioned],
+                relation_type='IsNewVersionOf',
+            ).delete()
+
+            # create related identifiers on the new resources for the current resources and vice versa
+            RelatedIdentifier.objects.bulk_create([
+                related_identifier
+                for resource, resource_copy in versioned
+                for related_identifier in get_version_related_identifiers(resource, resource_copy)
+            ])
+            mark_resources_changed([resource.pk for resource, resource_copy in versioned])
+
+    return resource_copies
+
+
+def check_identifiers(identifiers):
+    # check with one query that none of the identifiers exists already or is used twice
+    keys = Counter((identifier.identifier, identifier.identifier_type) for identifier in identifiers)
+
+    existing = set(Identifier.objects.filter(
+        identifier__in=[identifier.identifier for identifier in identifiers]
+    ).values_list('identifier', 'identifier_type'))
+
+    collisions = sorted(key for key, count in keys.items() if key in existing or count > 1)
+    if collisions:
+        raise ValidationError(_('The new identifiers %(identifiers)s exist already or are not unique.') % {
+            'identifiers': ', '.join(identifier for identifier, identifier_type in collisions)
+        })
+
+
+def get_version_related_identifiers(resource, resource_copy):
+    return [
+        RelatedIdentifier(
+            resource=resource_copy,
+            identifier=resource.identifier,
+            order=get_settings('DATACITE_NEW_VERSION_ORDER'),
+            relation_type='IsNewVersionOf',
+            resource_type_general='Dataset'
+        ),
+        RelatedIdentifier(
+            resource=resource,
+            identifier=resource_copy.identifier,
+            order=get_settings('DATACITE_PREVIOUS_VERSION_ORDER'),
+            relation_type='IsPreviousVersionOf',
+            resource_type_general='Dataset'
+        )
+    ]
+
+
+def create_instances(model, instances):
+    # bulk_create only sets the primary keys of the instances if the database returns them (not on MySQL
+    # and only on SQLite and MariaDB with Django >= 4.0), otherwise the instances are saved one by one
+    if connections[router.db_for_write(model)].features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(instances)
+    else:
+        for instance in instances:
+            instance.save(force_insert=True)
+
+
+def get_copy_values(instance):
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name != 'resource'
+    }
@@ -126,6 +126,33 @@ def export_resource(resource):
     return data
 
 
+def export_resources(queryset, chunk_size=None):
+    for resource in iter_resources(queryset, chunk_size):
+        yield export_resource(resource)
+
+
+def iter_resources(queryset, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = get_settings('DATACITE_EXPORT_CHUNK_SIZE')
+
+    # walk the queryset in chunks ordered by pk (keyset pagination), so that
+    # only one chunk of resources and its prefetched relations is held in memory
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        resources = list(chunk_queryset.for_export()[:chunk_size])
+        if not resources:
+            break
+
+        yield from resources
+
+        if len(resources) < chunk_size:
+            break
+
+        last_pk = resources[-1].pk
+
+
 def export_title(title):
     if title.title_type:
         return {'title': title.title, 'titleType': title.title_type}
@@ -160,7 +187,7 @@ def export_name(name, contributor_type=None):
     if affiliations:
         data['affiliations'] = []
         for affiliation in affiliations:
-            affiliation_name_identifier = affiliation.name_identifiers.first()
+            affiliation_name_identifier = get_first(affiliation.name_identifiers)
             if affiliation_name_identifier:
                 data['affiliations'].append({
                     'affiliation': affiliation.name,
@@ -274,7 +301,7 @@ def export_funding_references(funding_reference):
         'funderName': funding_reference.funder.name
     }
 
-    name_identifier = funding_reference.funder.name_identifiers.first()
+    name_identifier = get_first(funding_reference.funder.name_identifiers)
     if name_identifier:
         data['funderIdentifier'] = name_identifier.name_identifier
         data['funderIdentifierType'] = name_identifier.name_identifier_scheme
@@ -361,3 +388,8 @@ def export_related_item(related_item):
                                 for contributor in contributors]
 
     return data
+
+
+def get_first(manager):
+    # same as manager.first(), but uses the prefetched instances from Resource.objects.for_export()
+    return min(manager.all(), key=lambda instance: instance.pk, default=None)
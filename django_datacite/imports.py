@@ -1,8 +1,18 @@
+import copy
+import io
 import logging
 import os
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from xml.etree.ElementTree import ParseError
 
+from django.db import models, transaction
 from django.utils.dateparse import parse_date
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from .models import (
     AlternateIdentifier,
     Contributor,
@@ -24,16 +34,392 @@ from .models import (
     Subject,
     Title,
 )
+from .parsers import XMLParser
+from .signals import mark_citations_changed, mark_resources_changed
 from .utils import get_settings
 
 logger = logging.getLogger(__name__)
 
+# the events only carry the model name and the primary key, so that logging or
+# reporting them does not trigger extra queries, e.g. in the __str__ methods
+ImportEvent = namedtuple('ImportEvent', ('model', 'pk', 'action'))
+
+
+class ImportSession:
+    # identity map for the shared entities (identifiers, names, subjects and geo locations), which are
+    # looked up or created only once when the session is used for a batch of imports,
+    # with dry_run=True nothing is written and the changes are collected in diffs instead
+
+    def __init__(self, dry_run=False, on_event=None, on_record=None):
+        self.dry_run = dry_run
+        self.on_event = on_event    # called with every ImportEvent
+        self.on_record = on_record  # called with the resource and the events of every imported record
+        self.counts = Counter()     # number of created, updated and unchanged records
+        self.related_counts = Counter()  # number of created, updated and unchanged related items
+        self.events = Counter()     # (model, action) -> number of events in the session
+        self.record_events = None   # (model, action) -> number of events of the current record
+        self.diffs = []             # one diff for every resource, if dry_run is set
+        self.clear()
+
+    def clear(self):
+        # needs to be called when a transaction, which used the session, is rolled back
+        self.identifiers = {}       # (identifier, identifier_type) -> Identifier
+        self.name_identifiers = {}  # (name_identifier, name_identifier_scheme) -> NameIdentifier
+        self.names = {}             # name -> Name
+        self.affiliations = {}      # name.pk -> set of affiliation pks
+        self.subjects = {}          # (scheme_uri, value_uri) or subject -> Subject
+        self.geo_locations = {}     # geo_location_place -> GeoLocation
+        self.geo_location_rows = {}  # (GeoLocationPoint or GeoLocationBox, geo_location.pk) -> instance or None
+        self.related_items = {}     # (identifier, identifier_type) -> (item data, Resource)
+
+    def import_resource(self, resource_instance, data, bulk=False):
+        return import_resource(resource_instance, data, bulk=bulk, session=self)
+
+    def prefetch(self, records):
+        prefetch_entities(records, self)
+
+    def add_event(self, event):
+        self.events[(event.model, event.action)] += 1
+        if self.record_events is not None:
+            self.record_events[(event.model, event.action)] += 1
+        if self.on_event is not None:
+            self.on_event(event)
+
+
+def add_event(model, pk, action, session=None):
+    logger.info('%s pk=%s %s', model.__name__, pk, action)
+    if session is not None:
+        session.add_event(ImportEvent(model.__name__, pk, action))
+
+
+def prefetch_entities(records, session):
+    # fetch the existing shared entities of many records into the session with one query per model,
+    # instead of one query per row, the entities which do not exist yet are still created one by one
+    identifier_keys, name_identifier_keys, names, subject_nodes, geo_location_places = set(), set(), set(), [], set()
+    for data in records:
+        collect_entity_keys(data, identifier_keys, name_identifier_keys, names, subject_nodes, geo_location_places)
+
+    if identifier_keys:
+        for identifier_instance in Identifier.objects.filter(
+            identifier__in={identifier for identifier, identifier_type in identifier_keys}
+        ):
+            key = (identifier_instance.identifier, identifier_instance.identifier_type)
+            if key in identifier_keys:
+                session.identifiers[key] = identifier_instance
+
+    if name_identifier_keys:
+        for name_identifier_instance in NameIdentifier.objects.filter(
+            name_identifier__in={name_identifier for name_identifier, scheme in name_identifier_keys}
+        ).select_related('name'):
+            key = (name_identifier_instance.name_identifier, name_identifier_instance.name_identifier_scheme)
+            if key in name_identifier_keys:
+                session.name_identifiers[key] = name_identifier_instance
+
+    if names:
+        # like in import_name, the first name wins if the same name exists more than once
+        for name_instance in Name.objects.filter(name__in=names).order_by('-pk'):
+            session.names[name_instance.name] = name_instance
+
+    name_ids = {name_instance.pk for name_instance in session.names.values()} | {
+        name_identifier_instance.name_id for name_identifier_instance in session.name_identifiers.values()
+    }
+    if name_ids:
+        affiliations = {name_id: set() for name_id in name_ids}
+        for from_name_id, to_name_id in Name.affiliations.through.objects.filter(
+            from_name__in=name_ids
+        ).values_list('from_name', 'to_name'):
+            affiliations[from_name_id].add(to_name_id)
+        session.affiliations.update(affiliations)
+
+    if subject_nodes:
+        # like in import_subject, the subjects are found by their uris first and by their subject then
+        uri_subjects, subjects = {}, {}
+        for subject_instance in Subject.objects.filter(
+            models.Q(subject__in={subject for subject, scheme_uri, value_uri in subject_nodes}) |
+            models.Q(value_uri__in={value_uri for subject, scheme_uri, value_uri in subject_nodes if value_uri})
+        ).order_by('-pk'):
+            uri_subjects[(subject_instance.scheme_uri, subject_instance.value_uri)] = subject_instance
+            subjects[subject_instance.subject] = subject_instance
+
+        for subject, scheme_uri, value_uri in subject_nodes:
+            if scheme_uri and value_uri:
+                subject_instance = uri_subjects.get((scheme_uri, value_uri)) or subjects.get(subject)
+                if subject_instance is not None:
+                    session.subjects[(scheme_uri, value_uri)] = subject_instance
+            elif subject in subjects:
+                session.subjects[subject] = subjects[subject]
+
+    if geo_location_places:
+        # like in import_geo_location, the point and the box of the geo locations are fetched as well
+        for geo_location_instance in GeoLocation.objects.filter(
+            geo_location_place__in=geo_location_places
+        ).order_by('-pk'):
+            session.geo_locations[geo_location_instance.geo_location_place] = geo_location_instance
+
+        geo_location_ids = {geo_location_instance.pk for geo_location_instance in session.geo_locations.values()}
+        for model in (GeoLocationPoint, GeoLocationBox):
+            session.geo_location_rows.update({(model, geo_location_id): None for geo_location_id in geo_location_ids})
+            for instance in model.objects.filter(geo_location__in=geo_location_ids).order_by('-pk'):
+                session.geo_location_rows[(model, instance.geo_location_id)] = instance
+
+
+def collect_entity_keys(data, identifier_keys, name_identifier_keys, names, subject_nodes, geo_location_places):
+    # collects the keys of the identifiers, name identifiers, names, subjects and geo locations of the data, in
+    # the same way they are looked up by import_identifier, import_name, import_subject and import_geo_location
+    def add_identifier(identifier, identifier_type):
+        if identifier and identifier_type:
+            if identifier_type == 'DOI':
+                identifier = identifier.replace(get_settings('DOI_BASE_URL'), '')
+            identifier_keys.add((identifier, identifier_type))
+
+    def add_name(name_node):
+        for name_identifier_node in get_list(name_node, 'nameIdentifiers'):
+            if name_identifier_node.get('nameIdentifier'):
+                name_identifier_keys.add((name_identifier_node.get('nameIdentifier'),
+                                          name_identifier_node.get('nameIdentifierScheme')))
+
+        for affiliation_node in get_list(name_node, 'affiliations'):
+            add_name({
+                'name': affiliation_node.get('affiliation'),
+                'nameIdentifiers': [{
+                    'nameIdentifier': affiliation_node.get('affiliationIdentifier'),
+                    'nameIdentifierScheme': affiliation_node.get('affiliationIdentifierScheme')
+                }]
+            })
+
+        name = name_node.get('name')
+        if name is None and name_node.get('givenName') and name_node.get('familyName'):
+            name = '{} {}'.format(name_node.get('givenName'), name_node.get('familyName'))
+        if name:
+            names.add(name)
+
+    identifier_nodes = get_list(data, 'identifiers')
+    if len(identifier_nodes) == 1:
+        add_identifier(identifier_nodes[0].get('identifier'), identifier_nodes[0].get('identifierType'))
+
+    for node in get_list(data, 'alternateIdentifiers'):
+        add_identifier(node.get('alternateIdentifier'), node.get('alternateIdentifierType'))
+
+    for node in get_list(data, 'relatedIdentifiers'):
+        add_identifier(node.get('relatedIdentifier'), node.get('relatedIdentifierType'))
+
+    for node in get_list(data, 'creators') + get_list(data, 'contributors'):
+        add_name(node)
+
+    for node in get_list(data, 'fundingReferences'):
+        add_name({
+            'name': node.get('funderName'),
+            'nameIdentifiers': [{
+                'nameIdentifier': node.get('funderIdentifier'),
+                'nameIdentifierScheme': node.get('funderIdentifierType')
+            }]
+        })
+
+    for node in get_list(data, 'subjects'):
+        subject_nodes.append((node.get('subject'), node.get('schemeURI', ''), node.get('valueURI', '')))
+
+    for node in get_list(data, 'geoLocations'):
+        geo_location_places.add(node.get('geoLocationPlace', ''))
+
+    for node in get_list(data, 'relatedItems'):
+        collect_entity_keys({
+            'identifiers': [{
+                'identifier': node.get('relatedItemIdentifier'),
+                'identifierType': node.get('relatedItemIdentifierType')
+            }],
+            'creators': node.get('creators'),
+            'contributors': node.get('contributors')
+        }, identifier_keys, name_identifier_keys, names, subject_nodes, geo_location_places)
+
+
+def get_list(data, key):
+    value = data.get(key)
+    return value if value and isinstance(value, list) else []
+
+
+def get_resource_instance(data):
+    # find the existing resource for the identifier in the data or return a new resource
+    identifier_nodes = data.get('identifiers', [])
+    if identifier_nodes and isinstance(identifier_nodes, list) and len(identifier_nodes) == 1:
+        identifier = identifier_nodes[0].get('identifier')
+        identifier_type = identifier_nodes[0].get('identifierType')
+
+        if identifier and identifier_type == 'DOI':
+            identifier = identifier.replace(get_settings('DOI_BASE_URL'), '')
+
+        resource_instance = Resource.objects.filter(
+            identifier__identifier=identifier,
+            identifier__identifier_type=identifier_type
+        ).first()
+        if resource_instance is not None:
+            return resource_instance
+
+    return Resource()
 
-def import_resource(resource_instance, data):
+
+def import_resource(resource_instance, data, bulk=False, session=None, related=False):
+    # related is set for the nested imports of the related items, which are not counted as records
+    if session is not None and session.record_events is None:
+        # collect the events of the record, the nested imports of the related items are part of it
+        session.record_events = Counter()
+        try:
+            resource_instance = import_resource(resource_instance, data, bulk, session, related)
+            record_events = session.record_events
+        finally:
+            session.record_events = None
+
+        if session.on_record is not None:
+            session.on_record(resource_instance, record_events)
+        return resource_instance
+
+    if session is not None and session.dry_run:
+        return diff_resource(resource_instance, data, session, related)
+
+    created = resource_instance._state.adding
+    field_values = get_field_values(resource_instance)
+
+    import_resource_fields(resource_instance, data, session)
+
+    # save here so the import of the related fields work as expected,
+    # but only if the resource is new or one of its fields has changed
+    changed = created or get_field_values(resource_instance) != field_values
+    if changed:
+        resource_instance.save()
+
+    rows = iter_resource_rows(resource_instance, data, bulk, session)
+    subject_instances = import_subjects(data, session)
+    geo_location_instances = import_geo_locations(data, session)
+
+    if bulk:
+        # collect all rows first and write them with bulk queries afterwards
+        actions = apply_resource_rows(resource_instance, list(rows), session)
+    else:
+        actions = Counter()
+        for model, lookup, defaults in rows:
+            instance, action = update_or_create_instance(model, lookup, defaults)
+            add_event(model, instance.pk, action, session)
+            actions[action] += 1
+
+    # only add the subjects and geo locations, which are not yet related to the resource
+    for manager, instances in [
+        (resource_instance.subjects, subject_instances),
+        (resource_instance.geo_locations, geo_location_instances)
+    ]:
+        if instances:
+            # a new resource has no subjects and geo locations yet
+            existing_ids = set() if created else set(manager.values_list('pk', flat=True))
+            missing_instances = [instance for instance in instances if instance.pk not in existing_ids]
+            if missing_instances:
+                manager.add(*missing_instances)
+                actions['created'] += len(missing_instances)
+
+    if actions['created'] or actions['updated']:
+        # the citation depends on the related rows, bulk_create and bulk_update do not send signals
+        mark_citations_changed([resource_instance.pk])
+
+    if created:
+        action = 'created'
+    elif changed or actions['created'] or actions['updated']:
+        action = 'updated'
+    else:
+        action = 'unchanged'
+
+    add_event(Resource, resource_instance.pk, action, session)
+    if session is not None:
+        (session.related_counts if related else session.counts)[action] += 1
+
+    return resource_instance
+
+
+def diff_resource(resource_instance, data, session, related=False):
+    # collect the changes, which import_resource would make, without writing to the database,
+    # the existing rows are fetched with one query per table
+    resource_instance = copy.copy(resource_instance)
+    created = resource_instance._state.adding
+    field_values = get_diff_values(resource_instance)
+
+    import_resource_fields(resource_instance, data, session)
+
+    diff = {
+        'resource': str(resource_instance),
+        'related_item': related,
+        'fields': {
+            field_name: [field_values[field_name], value]
+            for field_name, value in get_diff_values(resource_instance).items()
+            if value != field_values[field_name]
+        },
+        'relations': {}
+    }
+
+    rows = list(iter_resource_rows(resource_instance, data, session=session))
+    for model, create_rows, update_rows, unchanged_instances in plan_resource_rows(resource_instance, rows):
+        diff['relations'][model.__name__] = {
+            'created': [
+                {
+                    field_name: get_diff_value(value)
+                    for field_name, value in {**lookup, **defaults}.items() if field_name != 'resource'
+                } for lookup, defaults in create_rows
+            ],
+            'updated': [
+                {
+                    field_name: [get_diff_value(old), get_diff_value(new)]
+                    for field_name, (old, new) in changes.items()
+                } for _, changes in update_rows
+            ],
+            'unchanged': len(unchanged_instances)
+        }
+
+    for model, field_name, instances in [
+        (Subject, 'subjects', import_subjects(data, session)),
+        (GeoLocation, 'geo_locations', import_geo_locations(data, session))
+    ]:
+        if instances:
+            existing_ids = set()
+            if resource_instance.pk is not None:
+                existing_ids = set(getattr(resource_instance, field_name).values_list('pk', flat=True))
+            diff['relations'][model.__name__] = {
+                'created': [str(instance) for instance in instances if instance.pk not in existing_ids],
+                'updated': [],
+                'unchanged': len([instance for instance in instances if instance.pk in existing_ids])
+            }
+
+    if created:
+        diff['action'] = 'created'
+    elif diff['fields'] or any(
+        relation['created'] or relation['updated'] for relation in diff['relations'].values()
+    ):
+        diff['action'] = 'updated'
+    else:
+        diff['action'] = 'unchanged'
+
+    session.diffs.append(diff)
+    (session.related_counts if related else session.counts)[diff['action']] += 1
+
+    return resource_instance
+
+
+def get_diff_values(instance):
+    return {
+        field.name: get_diff_value(getattr(instance, field.name), field)
+        for field in instance._meta.concrete_fields
+        if field.editable and not field.primary_key
+    }
+
+
+def get_diff_value(value, field=None):
+    if isinstance(value, models.Model):
+        return str(value)
+    elif field is not None:
+        return field.to_python(value)
+    else:
+        return value
+
+
+def import_resource_fields(resource_instance, data, session=None):
     # identifier and identifierType
     identifier_nodes = data.get('identifiers', [])
     if identifier_nodes and isinstance(identifier_nodes, list) and len(identifier_nodes) == 1:
-        resource_instance.identifier = import_identifier(identifier_nodes[0])
+        resource_instance.identifier = import_identifier(identifier_nodes[0], session)
 
     # publisher
     publisher = data.get('publisher')
@@ -76,8 +462,9 @@ def import_resource(resource_instance, data):
     if version is not None:
         resource_instance.version = version
 
-    # save here so the import of the related fields work as expected
-    resource_instance.save()
+
+def iter_resource_rows(resource_instance, data, bulk=False, session=None):
+    # yields (model, lookup, defaults) for every row of the resource, in the form of update_or_create
 
     # titles
     title_nodes = data.get('titles')
@@ -86,45 +473,39 @@ def import_resource(resource_instance, data):
             title = title_node.get('title')
             title_type = title_node.get('titleType', '')
             if title and Title.validate_title_type(title_type):
-                title_instance, created = Title.objects.update_or_create(
-                    resource=resource_instance,
-                    title_type=title_node.get('titleType', ''),
-                    defaults={
-                        'title': title
-                    }
-                )
-                logger.info('Title="%s" %s', title_instance, 'created' if created else 'updated')
+                yield Title, {
+                    'resource': resource_instance,
+                    'title_type': title_node.get('titleType', '')
+                }, {
+                    'title': title
+                }
 
     # creators
     creator_nodes = data.get('creators')
     if creator_nodes and isinstance(creator_nodes, list):
         for order, creator_node in enumerate(creator_nodes):
-            name_instance = import_name(creator_node)
+            name_instance = import_name(creator_node, session)
             if name_instance:
-                creator_instance, created = Creator.objects.update_or_create(
-                    resource=resource_instance,
-                    name=name_instance,
-                    defaults={
-                        'order': order
-                    }
-                )
-                logger.info('Creator="%s" %s', creator_instance, 'created' if created else 'updated')
+                yield Creator, {
+                    'resource': resource_instance,
+                    'name': name_instance
+                }, {
+                    'order': order
+                }
 
-    # titles
+    # descriptions
     description_nodes = data.get('descriptions')
     if description_nodes and isinstance(description_nodes, list):
         for description_node in description_nodes:
             description_type = description_node.get('descriptionType')
             if Description.validate_description_type(description_type):
-                description_instance, created = Description.objects.update_or_create(
-                    resource=resource_instance,
-                    description_type=description_type,
-                    defaults={
-                        'description': description_node.get('description', '')
-                                                       .replace('<br>', os.linesep + os.linesep)
-                    }
-                )
-                logger.info('Description="%s" %s', description_instance, 'created' if created else 'updated')
+                yield Description, {
+                    'resource': resource_instance,
+                    'description_type': description_type
+                }, {
+                    'description': description_node.get('description', '')
+                                                   .replace('<br>', os.linesep + os.linesep)
+                }
 
     # contributors
     contributors_nodes = data.get('contributors')
@@ -132,24 +513,15 @@ def import_resource(resource_instance, data):
         for order, contributor_node in enumerate(contributors_nodes):
             contributor_type = contributor_node.get('contributorType')
             if Contributor.validate_contributor_type(contributor_type):
-                name_instance = import_name(contributor_node)
+                name_instance = import_name(contributor_node, session)
                 if name_instance:
-                    contributor_instance, created = Contributor.objects.update_or_create(
-                        resource=resource_instance,
-                        name=name_instance,
-                        defaults={
-                            'order': order,
-                            'contributor_type': contributor_type
-                        }
-                    )
-                    logger.info('Contributor="%s" %s', contributor_instance, 'created' if created else 'updated')
-
-    # subjects
-    subject_nodes = data.get('subjects')
-    if subject_nodes and isinstance(subject_nodes, list):
-        for subject_node in subject_nodes:
-            subject_instance = import_subject(subject_node)
-            resource_instance.subjects.add(subject_instance)
+                    yield Contributor, {
+                        'resource': resource_instance,
+                        'name': name_instance
+                    }, {
+                        'order': order,
+                        'contributor_type': contributor_type
+                    }
 
     # dates
     date_nodes = data.get('dates')
@@ -158,15 +530,13 @@ def import_resource(resource_instance, data):
             date = parse_date(date_node.get('date'))
             date_type = date_node.get('dateType')
             if date is not None and Date.validate_date_type(date_type):
-                date_instance, created = Date.objects.update_or_create(
-                    resource=resource_instance,
-                    date_type=date_node.get('dateType'),
-                    defaults={
-                        'date': date,
-                        'date_information': date_node.get('dateInformation', '')
-                    }
-                )
-                logger.info('Date="%s" %s', date_instance, 'created' if created else 'updated')
+                yield Date, {
+                    'resource': resource_instance,
+                    'date_type': date_node.get('dateType')
+                }, {
+                    'date': date,
+                    'date_information': date_node.get('dateInformation', '')
+                }
 
     # alternateIdentifiers
     alternate_identifier_nodes = data.get('alternateIdentifiers')
@@ -176,18 +546,15 @@ def import_resource(resource_instance, data):
                 'identifier': alternate_identifier_node.get('alternateIdentifier'),
                 'identifierType': alternate_identifier_node.get('alternateIdentifierType'),
                 'citation': alternate_identifier_node.get('citation', '')
-            })
+            }, session)
 
             if identifier_instance is not None:
-                alternate_identifier_instance, created = AlternateIdentifier.objects.update_or_create(
-                    resource=resource_instance,
-                    identifier=identifier_instance,
-                    defaults={
-                        'order': order
-                    }
-                )
-                logger.info('AlternateIdentifier="%s" %s',
-                            alternate_identifier_instance, 'created' if created else 'updated')
+                yield AlternateIdentifier, {
+                    'resource': resource_instance,
+                    'identifier': identifier_instance
+                }, {
+                    'order': order
+                }
 
     # relatedIdentifiers
     related_identifier_nodes = data.get('relatedIdentifiers')
@@ -201,24 +568,21 @@ def import_resource(resource_instance, data):
                     'identifier': related_identifier_node.get('relatedIdentifier'),
                     'identifierType': related_identifier_node.get('relatedIdentifierType'),
                     'citation': related_identifier_node.get('citation', '')
-                })
+                }, session)
 
                 if identifier_instance is not None:
                     resource_type_general = related_identifier_node.get('resourceTypeGeneral')
                     if not RelatedIdentifier.validate_resource_type_general(resource_type_general):
                         resource_type_general = RelatedIdentifier.get_default_resource_type_general()
 
-                    related_identifier_instance, created = RelatedIdentifier.objects.update_or_create(
-                        resource=resource_instance,
-                        identifier=identifier_instance,
-                        defaults={
-                            'order': order,
-                            'relation_type': relation_type,
-                            'resource_type_general': resource_type_general
-                        }
-                    )
-                    logger.info('RelatedIdentifier="%s" %s',
-                                related_identifier_instance, 'created' if created else 'updated')
+                    yield RelatedIdentifier, {
+                        'resource': resource_instance,
+                        'identifier': identifier_instance
+                    }, {
+                        'order': order,
+                        'relation_type': relation_type,
+                        'resource_type_general': resource_type_general
+                    }
 
     # rightsList
     right_list_node = data.get('rightsList')
@@ -232,18 +596,10 @@ def import_resource(resource_instance, data):
                 rights_identifier = Rights.get_rights_identifier_by_uri(rights_uri)
 
             if rights_identifier:
-                rights_instance, created = Rights.objects.update_or_create(
-                    resource=resource_instance,
-                    rights_identifier=rights_identifier
-                )
-                logger.info('Rights="%s" %s', rights_instance, 'created' if created else 'updated')
-
-    # geoLocations
-    geo_locations_node = data.get('geoLocations')
-    if geo_locations_node and isinstance(geo_locations_node, list):
-        for geo_location_node in geo_locations_node:
-            geo_location_instance = import_geo_location(geo_location_node)
-            resource_instance.geo_locations.add(geo_location_instance)
+                yield Rights, {
+                    'resource': resource_instance,
+                    'rights_identifier': rights_identifier
+                }, {}
 
     # funding_references
     funding_reference_nodes = data.get('fundingReferences')
@@ -258,76 +614,227 @@ def import_resource(resource_instance, data):
                         'nameIdentifierScheme': funding_reference_node.get('funderIdentifierType')
                     }
                 ]
-            })
-            if name_instance:
-                funding_reference_instance, created = FundingReference.objects.update_or_create(
-                    resource=resource_instance,
-                    funder=funder_instance,
-                    defaults={
-                        'award_number': funding_reference_node.get('awardNumber', ''),
-                        'award_uri': funding_reference_node.get('awardURI', ''),
-                        'award_title': funding_reference_node.get('awardTitle', '')
-                    }
-                )
-                logger.info('FundingReference="%s" %s',
-                            funding_reference_instance, 'created' if created else 'updated')
+            }, session)
+            if funder_instance:
+                yield FundingReference, {
+                    'resource': resource_instance,
+                    'funder': funder_instance
+                }, {
+                    'award_number': funding_reference_node.get('awardNumber', ''),
+                    'award_uri': funding_reference_node.get('awardURI', ''),
+                    'award_title': funding_reference_node.get('awardTitle', '')
+                }
 
     # related_items
     related_item_nodes = data.get('relatedItems')
     if related_item_nodes and isinstance(related_item_nodes, list):
         for related_item_node in related_item_nodes:
-            identifier = related_item_node.get('relatedItemIdentifier')
-            identifier_type = related_item_node.get('relatedItemIdentifierType')
-
-            # try to find the related item as existing resource in the database
-            try:
-                item_instance = Resource.objects.get(
-                    identifier__identifier=identifier,
-                    identifier__identifier_type=identifier_type
-                )
-            except Resource.DoesNotExist:
-                item_instance = Resource()
-
-            # create or update the related item resource
-            item_instance = import_resource(item_instance, {
-                'types': {
-                    'resourceTypeGeneral': related_item_node.get('relatedItemType')
-                },
-                'identifiers': [{
-                    'identifier': identifier,
-                    'identifierType': identifier_type
-                }],
-                'creators': related_item_node.get('creators'),
-                'titles': related_item_node.get('titles'),
-                'publicationYear': related_item_node.get('publicationYear'),
-                'publisher': related_item_node.get('publisher'),
-                'contributors': related_item_node.get('contributors')
-            })
+            item_instance = import_related_item(related_item_node, bulk, session)
 
             number_type = related_item_node.get('numberType')
             if not RelatedItem.validate_number_type(number_type):
                 number_type = RelatedItem.get_default_number_type()
 
-            related_item_instance, created = RelatedItem.objects.update_or_create(
-                resource=resource_instance,
-                item=item_instance,
-                defaults={
-                    'relation_type': related_item_node.get('relationType', ''),
-                    'volume': related_item_node.get('volume', ''),
-                    'issue': related_item_node.get('issue', ''),
-                    'number': related_item_node.get('number', ''),
-                    'number_type': number_type,
-                    'first_page': related_item_node.get('firstPage', ''),
-                    'last_page': related_item_node.get('lastPage', ''),
-                    'edition': related_item_node.get('edition', ''),
-                }
-            )
-            logger.info('RelatedItem="%s" %s', related_item_instance, 'created' if created else 'updated')
+            yield RelatedItem, {
+                'resource': resource_instance,
+                'item': item_instance
+            }, {
+                'relation_type': related_item_node.get('relationType', ''),
+                'volume': related_item_node.get('volume', ''),
+                'issue': related_item_node.get('issue', ''),
+                'number': related_item_node.get('number', ''),
+                'number_type': number_type,
+                'first_page': related_item_node.get('firstPage', ''),
+                'last_page': related_item_node.get('lastPage', ''),
+                'edition': related_item_node.get('edition', ''),
+            }
 
-    return resource_instance
 
+def import_related_item(related_item_node, bulk=False, session=None):
+    identifier = related_item_node.get('relatedItemIdentifier')
+    identifier_type = related_item_node.get('relatedItemIdentifierType')
+
+    item_data = {
+        'types': {
+            'resourceTypeGeneral': related_item_node.get('relatedItemType')
+        },
+        'identifiers': [{
+            'identifier': identifier,
+            'identifierType': identifier_type
+        }],
+        'creators': related_item_node.get('creators'),
+        'titles': related_item_node.get('titles'),
+        'publicationYear': related_item_node.get('publicationYear'),
+        'publisher': related_item_node.get('publisher'),
+        'contributors': related_item_node.get('contributors')
+    }
+
+    # items, which are shared by many records (e.g. a journal), are only imported
+    # again if their data differs from the last import in this session
+    key = (identifier, identifier_type)
+    if session is not None and key in session.related_items:
+        cached_data, item_instance = session.related_items[key]
+        if cached_data == item_data:
+            return item_instance
+
+    # try to find the related item as existing resource in the database
+    try:
+        item_instance = Resource.objects.get(
+            identifier__identifier=identifier,
+            identifier__identifier_type=identifier_type
+        )
+    except Resource.DoesNotExist:
+        item_instance = Resource()
+
+    # create or update the related item resource
+    item_instance = import_resource(item_instance, item_data, bulk, session, related=True)
+
+    if session is not None:
+        session.related_items[key] = (item_data, item_instance)
+
+    return item_instance
+
+
+def import_subjects(data, session=None):
+    subject_instances = []
+    subject_nodes = data.get('subjects')
+    if subject_nodes and isinstance(subject_nodes, list):
+        for subject_node in subject_nodes:
+            subject_instances.append(import_subject(subject_node, session))
+    return subject_instances
+
+
+def import_geo_locations(data, session=None):
+    geo_location_instances = []
+    geo_locations_node = data.get('geoLocations')
+    if geo_locations_node and isinstance(geo_locations_node, list):
+        for geo_location_node in geo_locations_node:
+            geo_location_instances.append(import_geo_location(geo_location_node, session))
+    return geo_location_instances
+
+
+def apply_resource_rows(resource_instance, rows, session=None):
+    actions = Counter()
+
+    for model, create_rows, update_rows, unchanged_instances in plan_resource_rows(resource_instance, rows):
+        create_instances = [model(**lookup, **defaults) for lookup, defaults in create_rows]
+
+        update_instances, update_fields = [], set()
+        for instance, changes in update_rows:
+            for field_name, (_, value) in changes.items():
+                setattr(instance, field_name, value)
+            update_fields.update(changes)
+            update_instances.append(instance)
+
+        if create_instances:
+            model.objects.bulk_create(create_instances)
+        if update_instances:
+            model.objects.bulk_update(update_instances, sorted(update_fields))
+
+        for action, instances in [
+            ('created', create_instances),
+            ('updated', update_instances),
+            ('unchanged', unchanged_instances)
+        ]:
+            for instance in instances:
+                add_event(model, instance.pk, action, session)
+            actions[action] += len(instances)
+
+    if actions['created'] or actions['updated']:
+        # bulk_create and bulk_update do not send signals
+        mark_resources_changed([resource_instance.pk])
+
+    return actions
+
+
+def plan_resource_rows(resource_instance, rows):
+    # yields (model, create_rows, update_rows, unchanged_instances) for every model, where create_rows
+    # contains (lookup, defaults) and update_rows contains (instance, {field_name: (old, new)})
+
+    # group the rows by model, later rows for the same lookup replace earlier ones, like update_or_create
+    rows_by_model = {}
+    for model, lookup, defaults in rows:
+        rows_by_model.setdefault(model, {})[get_row_key(lookup)] = (lookup, defaults)
+
+    for model, model_rows in rows_by_model.items():
+        lookup_fields = [model._meta.get_field(field_name) for field_name in next(iter(model_rows.values()))[0]]
+
+        # fetch all existing rows of this model for the resource with one query,
+        # the first row wins if there is more than one row for a lookup
+        existing_instances = {}
+        if resource_instance.pk is not None:
+            for instance in model.objects.filter(resource=resource_instance).order_by('-pk'):
+                existing_instances[get_row_key({
+                    field.name: getattr(instance, field.attname) for field in lookup_fields
+                })] = instance
+
+        create_rows, update_rows, unchanged_instances = [], [], []
+        for key, (lookup, defaults) in model_rows.items():
+            instance = existing_instances.get(key)
+            if instance is None:
+                create_rows.append((lookup, defaults))
+            else:
+                changed_fields = get_changed_fields(instance, defaults)
+                if changed_fields:
+                    update_rows.append((instance, {
+                        field_name: (getattr(instance, field_name), defaults[field_name])
+                        for field_name in changed_fields
+                    }))
+                else:
+                    unchanged_instances.append(instance)
+
+        yield model, create_rows, update_rows, unchanged_instances
+
+
+def update_or_create_instance(model, lookup, defaults):
+    # like update_or_create, but the instance is only saved if one of the values has changed
+    instance = model.objects.filter(**lookup).order_by('pk').first()
+    return update_or_create_existing_instance(model, instance, lookup, defaults)
+
+
+def update_or_create_existing_instance(model, instance, lookup, defaults):
+    # instance is the existing instance for the lookup, which was already fetched, or None
+    if instance is None:
+        return model.objects.create(**lookup, **defaults), 'created'
+
+    changed_fields = get_changed_fields(instance, defaults)
+    if not changed_fields:
+        return instance, 'unchanged'
 
-def import_identifier(identifier_node):
+    for field_name in changed_fields:
+        setattr(instance, field_name, defaults[field_name])
+    instance.save(update_fields=changed_fields)
+    return instance, 'updated'
+
+
+def get_changed_fields(instance, values):
+    # compare the values after they are converted by the model field, e.g. '2020' and 2020 are equal
+    return [
+        field_name for field_name, value in values.items()
+        if instance._meta.get_field(field_name).to_python(value) != getattr(instance, field_name)
+    ]
+
+
+def get_field_values(instance):
+    return {
+        field.attname: field.to_python(getattr(instance, field.attname))
+        for field in instance._meta.concrete_fields
+    }
+
+
+def get_row_key(lookup):
+    return tuple(
+        (field_name, get_instance_key(value) if isinstance(value, models.Model) else value)
+        for field_name, value in sorted(lookup.items())
+    )
+
+
+def get_instance_key(instance):
+    # unsaved instances (only used by the dry run) are compared by identity
+    return instance.pk if instance.pk is not None else id(instance)
+
+
+def import_identifier(identifier_node, session=None):
     identifier = identifier_node.get('identifier')
     identifier_type = identifier_node.get('identifierType')
 
@@ -335,21 +842,39 @@ def import_identifier(identifier_node):
         identifier = identifier.replace(get_settings('DOI_BASE_URL'), '')
 
     if identifier and Identifier.validate_identifier_type(identifier_type):
-        identifier_instance, created = Identifier.objects.update_or_create(
+        if session is not None and (identifier, identifier_type) in session.identifiers:
+            return session.identifiers[(identifier, identifier_type)]
+
+        if session is not None and session.dry_run:
+            identifier_instance = Identifier.objects.filter(
+                identifier=identifier,
+                identifier_type=identifier_type
+            ).first() or Identifier(
+                identifier=identifier,
+                identifier_type=identifier_type,
+                citation=identifier_node.get('citation', '')
+            )
+            session.identifiers[(identifier, identifier_type)] = identifier_instance
+            return identifier_instance
+
+        # the citation is only set when the instance is initially created
+        identifier_instance, created = Identifier.objects.get_or_create(
             identifier=identifier,
-            identifier_type=identifier_type
+            identifier_type=identifier_type,
+            defaults={
+                'citation': identifier_node.get('citation', '')
+            }
         )
 
-        if created:
-            # set citation only when the instance is initially created
-            identifier_instance.citation = identifier_node.get('citation', '')
-            identifier_instance.save()
+        add_event(Identifier, identifier_instance.pk, 'created' if created else 'found', session)
+
+        if session is not None:
+            session.identifiers[(identifier, identifier_type)] = identifier_instance
 
-        logger.info('Identifier="%s" %s', identifier_instance, 'created' if created else 'updated')
         return identifier_instance
 
 
-def import_name(name_node):
+def import_name(name_node, session=None):
     # search for name identifiers
     name_identifier_instances = []
     name_identifier_nodes = name_node.get('nameIdentifiers')
@@ -358,20 +883,28 @@ def import_name(name_node):
             name_identifier = name_identifier_node.get('nameIdentifier')
             name_identifier_scheme = name_identifier_node.get('nameIdentifierScheme')
             if name_identifier and NameIdentifier.validate_name_identifier_scheme(name_identifier_scheme):
+                if session is not None and (name_identifier, name_identifier_scheme) in session.name_identifiers:
+                    name_identifier_instances.append(
+                        session.name_identifiers[(name_identifier, name_identifier_scheme)]
+                    )
+                    continue
+
                 try:
                     name_identifier_instance = NameIdentifier.objects.get(
                         name_identifier=name_identifier,
                         name_identifier_scheme=name_identifier_scheme
                     )
-                    logger.info('NameIdentifier="%s" found', name_identifier_instance)
+                    add_event(NameIdentifier, name_identifier_instance.pk, 'found', session)
                 except NameIdentifier.DoesNotExist:
                     name_identifier_instance = NameIdentifier(
                         name_identifier=name_identifier,
                         name_identifier_scheme=name_identifier_scheme
                     )
-                    logger.info('NameIdentifier="%s" created', name_identifier_instance)
                 name_identifier_instances.append(name_identifier_instance)
 
+                if session is not None:
+                    session.name_identifiers[(name_identifier, name_identifier_scheme)] = name_identifier_instance
+
     # search for affiliations
     affiliation_instances = []
     affiliation_nodes = name_node.get('affiliations')
@@ -394,7 +927,7 @@ def import_name(name_node):
                             'nameIdentifierScheme': affiliation_name_identifier_scheme
                         }
                     ]
-                })
+                }, session)
 
                 if affiliation_instance:
                     affiliation_instances.append(affiliation_instance)
@@ -403,14 +936,22 @@ def import_name(name_node):
     name = name_node.get('name')
     given_name = name_node.get('givenName')
     family_name = name_node.get('familyName')
+    name_created = False
     try:
         existing_name_identifier_instances = [
             name_identifier_instance
             for name_identifier_instance in name_identifier_instances
             if name_identifier_instance.id is not None
         ]
-        name_instance = Name.objects.get(name_identifiers__in=existing_name_identifier_instances)
-        logger.info('Name="%s" found by NameIdentifier', name_instance)
+        if session is not None and existing_name_identifier_instances:
+            # the name of the name identifiers in the session was already fetched or assigned
+            name_instance = existing_name_identifier_instances[0].name
+        else:
+            name_instance = Name.objects.filter(name_identifiers__in=existing_name_identifier_instances) \
+                                        .order_by('pk').first()
+            if name_instance is None:
+                raise Name.DoesNotExist
+            add_event(Name, name_instance.pk, 'found', session)
     except Name.DoesNotExist:
         if name is None:
             if given_name and family_name:
@@ -419,8 +960,14 @@ def import_name(name_node):
                 return
 
         try:
-            name_instance = Name.objects.get(name=name)
-            logger.info('Name="%s" found by Name', name_instance)
+            if session is not None and name in session.names:
+                name_instance = session.names[name]
+            else:
+                # concurrent imports might have created the same name more than once, use the first one then
+                name_instance = Name.objects.filter(name=name).order_by('pk').first()
+                if name_instance is None:
+                    raise Name.DoesNotExist
+                add_event(Name, name_instance.pk, 'found', session)
         except Name.DoesNotExist:
             name_type = name_node.get('nameType', Name.get_default_name_type())
             if not Name.validate_name_type(name_type):
@@ -428,81 +975,137 @@ def import_name(name_node):
 
             name_instance = Name(name=name, name_type=name_type,
                                  given_name=given_name or '', family_name=family_name or '')
-            name_instance.save()
-            logger.info('Name="%s" created', name_instance)
+            if session is None or not session.dry_run:
+                name_instance.save()
+                name_created = True
+                add_event(Name, name_instance.pk, 'created', session)
+
+    if session is not None and session.dry_run:
+        # the name identifiers and affiliations are not changed in a dry run
+        session.names[name_instance.name] = name_instance
+        return name_instance
 
     # update name identifiers
     for name_identifier_instance in name_identifier_instances:
-        try:
-            name_identifier_instance.name  # noqa: B018
-        except Name.DoesNotExist:
-            name_identifier_instance.name = name_instance
-            name_identifier_instance.save()
+        if name_identifier_instance.pk is None:
+            # get_or_create relies on the unique constraint, if another process created
+            # the name identifier in the meantime, the existing one is used
+            stored_name_identifier_instance, created = NameIdentifier.objects.get_or_create(
+                name_identifier=name_identifier_instance.name_identifier,
+                name_identifier_scheme=name_identifier_instance.name_identifier_scheme,
+                defaults={
+                    'name': name_instance
+                }
+            )
+            name_identifier_instance.pk = stored_name_identifier_instance.pk
+            name_identifier_instance.name = stored_name_identifier_instance.name
+            add_event(NameIdentifier, name_identifier_instance.pk, 'created' if created else 'found', session)
+
+            if name_created and not created and name_identifier_instance.name_id != name_instance.pk:
+                # another process created the same name concurrently, use this name instead, the name
+                # identifiers, which were already created for our name, are moved before it is deleted
+                NameIdentifier.objects.filter(name=name_instance).update(name=name_identifier_instance.name)
+                for instance in name_identifier_instances:
+                    if instance.name_id == name_instance.pk:
+                        instance.name = name_identifier_instance.name
+                name_instance.delete()
+                name_instance = name_identifier_instance.name
+                name_created = False
 
     # update affiliations
-    name_instance.affiliations.set(affiliation_instances)
+    if session is None:
+        name_instance.affiliations.set(affiliation_instances)
+    else:
+        session.names[name_instance.name] = name_instance
+
+        affiliation_ids = {affiliation_instance.pk for affiliation_instance in affiliation_instances}
+        if session.affiliations.get(name_instance.pk) != affiliation_ids:
+            name_instance.affiliations.set(affiliation_instances)
+            session.affiliations[name_instance.pk] = affiliation_ids
 
     return name_instance
 
 
-def import_subject(subject_node):
+def import_subject(subject_node, session=None):
     subject_instance = None
 
     subject = subject_node.get('subject')
     scheme_uri = subject_node.get('schemeURI', '')
     value_uri = subject_node.get('valueURI', '')
 
+    if session is not None:
+        subject_instance = session.subjects.get((scheme_uri, value_uri)) if scheme_uri and value_uri \
+            else session.subjects.get(subject)
+        if subject_instance is not None:
+            return subject_instance
+
+    # concurrent imports might have created the same subject more than once, use the first one then
     if scheme_uri and value_uri:
-        try:
-            subject_instance = Subject.objects.get(
-                scheme_uri=scheme_uri,
-                value_uri=value_uri
-            )
-            logger.info('Subject="%s" found', subject_instance)
-        except Subject.DoesNotExist:
-            pass
+        subject_instance = Subject.objects.filter(
+            scheme_uri=scheme_uri,
+            value_uri=value_uri
+        ).order_by('pk').first()
+        if subject_instance is not None:
+            add_event(Subject, subject_instance.pk, 'found', session)
 
     if subject_instance is None:
-
-        try:
-            subject_instance = Subject.objects.get(
-                subject=subject
-            )
-            logger.info('Subject="%s" found', subject_instance)
-        except Subject.DoesNotExist:
-            pass
+        subject_instance = Subject.objects.filter(
+            subject=subject
+        ).order_by('pk').first()
+        if subject_instance is not None:
+            add_event(Subject, subject_instance.pk, 'found', session)
 
     if subject_instance is None:
-        subject_instance = Subject.objects.create(
+        subject_instance = Subject(
             subject=subject,
             subject_scheme=subject_node.get('subjectScheme', ''),
             scheme_uri=scheme_uri,
             value_uri=value_uri,
             classification_code=subject_node.get('classificationCode', ''),
-
         )
-        logger.info('Subject="%s" created', subject_instance)
+        if session is None or not session.dry_run:
+            subject_instance.save()
+            add_event(Subject, subject_instance.pk, 'created', session)
+
+    if session is not None:
+        session.subjects[(scheme_uri, value_uri) if scheme_uri and value_uri else subject] = subject_instance
 
     return subject_instance
 
 
-def import_geo_location(geo_location_node):
-    geo_location_instance, created = GeoLocation.objects.update_or_create(
-        geo_location_place=geo_location_node.get('geoLocationPlace', '')
-    )
-    logger.info('GeoLocation="%s" %s', geo_location_instance, 'created' if created else 'updated')
+def import_geo_location(geo_location_node, session=None):
+    geo_location_place = geo_location_node.get('geoLocationPlace', '')
+
+    if session is not None and geo_location_place in session.geo_locations:
+        geo_location_instance = session.geo_locations[geo_location_place]
+        if session.dry_run:
+            return geo_location_instance
+
+    elif session is not None and session.dry_run:
+        geo_location_instance = GeoLocation.objects.filter(geo_location_place=geo_location_place).first() or \
+            GeoLocation(geo_location_place=geo_location_place)
+        session.geo_locations[geo_location_place] = geo_location_instance
+        return geo_location_instance
+
+    else:
+        geo_location_instance, created = GeoLocation.objects.get_or_create(geo_location_place=geo_location_place)
+        add_event(GeoLocation, geo_location_instance.pk, 'created' if created else 'found', session)
+
+        if session is not None:
+            session.geo_locations[geo_location_place] = geo_location_instance
+            if created:
+                # a new geo location has no point and no box yet
+                session.geo_location_rows[(GeoLocationPoint, geo_location_instance.pk)] = None
+                session.geo_location_rows[(GeoLocationBox, geo_location_instance.pk)] = None
 
     geo_location_point = geo_location_node.get('geoLocationPoint')
     if geo_location_point and \
             geo_location_point.get('pointLongitude') is not None and \
             geo_location_point.get('pointLatitude') is not None:
-        _, created = GeoLocationPoint.objects.update_or_create(
-            geo_location=geo_location_instance,
-            defaults={
-                'point_longitude': geo_location_point.get('pointLongitude'),
-                'point_latitude': geo_location_point.get('pointLatitude')
-            }
-        )
+        update_or_create_geo_location_row(GeoLocationPoint, geo_location_instance, {
+            'point_longitude': geo_location_point.get('pointLongitude'),
+            'point_latitude': geo_location_point.get('pointLatitude')
+        }, session)
 
     geo_location_bbox = geo_location_node.get('geoLocationBox')
     if geo_location_bbox and \
@@ -510,15 +1113,12 @@ def import_geo_location(geo_location_node):
             geo_location_bbox.get('eastBoundLongitude') is not None and \
             geo_location_bbox.get('southBoundLatitude') is not None and \
             geo_location_bbox.get('northBoundLatitude') is not None:
-        _, created = GeoLocationBox.objects.update_or_create(
-            geo_location=geo_location_instance,
-            defaults={
-                'west_bound_longitude': geo_location_bbox.get('westBoundLongitude'),
-                'east_bound_longitude': geo_location_bbox.get('eastBoundLongitude'),
-                'south_bound_latitude': geo_location_bbox.get('southBoundLatitude'),
-                'north_bound_latitude': geo_location_bbox.get('northBoundLatitude')
-            }
-        )
+        update_or_create_geo_location_row(GeoLocationBox, geo_location_instance, {
+            'west_bound_longitude': geo_location_bbox.get('westBoundLongitude'),
+            'east_bound_longitude': geo_location_bbox.get('eastBoundLongitude'),
+            'south_bound_latitude': geo_location_bbox.get('southBoundLatitude'),
+            'north_bound_latitude': geo_location_bbox.get('northBoundLatitude')
+        }, session)
 
     geo_location_polygons = geo_location_node.get('geoLocationPolygons', [])
     for geo_location_polygon in geo_location_polygons:
@@ -528,7 +1128,7 @@ def import_geo_location(geo_location_node):
                 [point.get('pointLongitude'), point.get('pointLatitude')]
                 for point in polygon_points
             ]
-            _, created = GeoLocationPolygon.objects.update_or_create(
+            GeoLocationPolygon.objects.get_or_create(
                 geo_location=geo_location_instance,
                 polygon_points=polygon_points_json,
                 in_point_longitude=geo_location_polygon.get('inPolygonPoint', {}).get('pointLongitude'),
@@ -536,3 +1136,100 @@ def import_geo_location(geo_location_node):
             )
 
     return geo_location_instance
+
+
+def update_or_create_geo_location_row(model, geo_location_instance, defaults, session=None):
+    # the point or the box of the geo location, which is only looked up if it is not in the session
+    lookup = {'geo_location': geo_location_instance}
+    key = (model, geo_location_instance.pk)
+    if session is not None and key in session.geo_location_rows:
+        instance, _ = update_or_create_existing_instance(model, session.geo_location_rows[key], lookup, defaults)
+    else:
+        instance, _ = update_or_create_instance(model, lookup, defaults)
+
+    if session is not None:
+        # like the fetched instances, the cached instance holds the converted values, e.g. floats
+        for field_name, value in defaults.items():
+            setattr(instance, field_name, model._meta.get_field(field_name).to_python(value))
+        session.geo_location_rows[key] = instance
+
+
+def import_urls(urls, bulk=False, max_workers=None):
+    # fetch the urls (or DOIs) concurrently and import them, one after another, while the
+    # remaining urls are still fetched, returns (url, resource or exception) for every url
+    session = ImportSession()
+    results = {}
+    for url, data, error in fetch_urls(urls, max_workers):
+        if error is None:
+            try:
+                if not isinstance(data, dict):
+                    raise ValueError('record is not a JSON object')
+
+                with transaction.atomic():
+                    results[url] = import_resource(get_resource_instance(data), data, bulk=bulk, session=session)
+            except Exception as e:
+                # entities of the rolled back import might be in the session
+                session.clear()
+                error = e
+
+        if error is not None:
+            logger.warning('Import of %s failed: %s', url, error)
+            results[url] = error
+
+    return [(url, results[url]) for url in urls]
+
+
+def fetch_urls(urls, max_workers=None):
+    # yields (url, data, error) in the order in which the requests finish
+    if max_workers is None:
+        max_workers = get_settings('DATACITE_IMPORT_MAX_WORKERS')
+
+    with get_http_session(max_workers) as http_session, ThreadPoolExecutor(max_workers) as executor:
+        futures = {executor.submit(fetch_data, http_session, get_import_url(url)): url for url in urls}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except (requests.RequestException, ParseError, ValueError) as e:
+                yield futures[future], None, e
+
+
+def fetch_data(http_session, url):
+    response = http_session.get(url, timeout=get_settings('DATACITE_IMPORT_TIMEOUT'))
+    response.raise_for_status()
+
+    if 'xml' in response.headers.get('Content-Type', ''):
+        data = XMLParser().parse(io.BytesIO(response.content))
+        if data is None:
+            raise ValueError('document does not contain a DataCite resource')
+        return data
+    else:
+        return response.json()
+
+
+def get_http_session(max_workers):
+    # one session with a connection pool for all threads, which retries failed requests with a backoff
+    retry = Retry(
+        total=get_settings('DATACITE_IMPORT_RETRIES'),
+        backoff_factor=get_settings('DATACITE_IMPORT_BACKOFF'),
+        status_forcelist=(429, 500, 502, 503, 504)
+    )
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+
+    http_session = requests.Session()
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+    http_session.headers['Accept'] = ', '.join([
+        'application/vnd.datacite.datacite+json',
+        'application/json;q=0.9',
+        'application/vnd.datacite.datacite+xml;q=0.8'
+    ])
+    return http_session
+
+
+def get_import_url(url):
+    # DOIs are resolved using content negotiation
+    url = url.strip()
+    if url.startswith(('http://', 'https://')):
+        return url
+    else:
+        return get_settings('DOI_BASE_URL') + url
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from ...copies import create_new_versions
+from ...models import Resource
+
+
+class Command(BaseCommand):
+    help = 'Create new versions of the resources with the given identifiers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('identifiers', nargs='+',
+                            help='Identifiers of the resources or - to read one identifier per line from stdin')
+
+    def handle(self, *args, **options):
+        identifiers = []
+        for identifier in options['identifiers']:
+            if identifier == '-':
+                identifiers += [line.strip() for line in sys.stdin if line.strip()]
+            else:
+                identifiers.append(identifier)
+
+        resources = list(Resource.objects.filter(identifier__identifier__in=identifiers)
+                                         .select_related('identifier').order_by('pk'))
+
+        missing = set(identifiers) - {resource.identifier.identifier for resource in resources}
+        if missing:
+            raise CommandError(f'No resources found for {", ".join(sorted(missing))}.')
+
+        try:
+            resource_copies = create_new_versions(resources)
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages)) from e
+
+        for resource, resource_copy in zip(resources, resource_copies):
+            self.stdout.write(f'{resource.identifier.identifier} -> {resource_copy.identifier.identifier}')
+
+        self.stdout.write(f'{len(resource_copies)} new versions created.')
@@ -0,0 +1,235 @@
+import json
+import logging
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from xml.etree.ElementTree import ParseError
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+from ...imports import ImportSession, get_resource_instance, import_resource
+from ...parsers import XMLParser
+from ...utils import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Import DataCite JSON or XML records from a file, a directory of files or stdin.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='NDJSON or XML file, directory with .json or .xml files or - for stdin (default: -)')
+        parser.add_argument('--format', choices=('json', 'xml'),
+                            help='Format of the input (default: xml for .xml files, json otherwise)')
+        parser.add_argument('--chunk-size', type=int, default=get_settings('DATACITE_IMPORT_CHUNK_SIZE'),
+                            help='Number of records per transaction')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of parallel processes, needs a database which allows '
+                                 'concurrent writes, e.g. PostgreSQL (default: 1)')
+        parser.add_argument('--bulk', action='store_true',
+                            help='Fetch the existing identifiers, names and subjects of each chunk at once '
+                                 'and write the rows of each record with bulk queries')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Do not write to the database, but print the changes of every record as JSON, '
+                                 'the changes of related items are marked with "related_item": true')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('xml' if path.endswith('.xml') else 'json')
+        if path == '-':
+            records = iter_xml('<stdin>', sys.stdin) if format == 'xml' else iter_lines('<stdin>', sys.stdin)
+        elif Path(path).is_dir():
+            records = iter_files(Path(path), format)
+        elif Path(path).is_file():
+            records = iter_file(Path(path), format)
+        else:
+            raise CommandError(f'{path} does not exist.')
+
+        self.timings, self.counts, self.related_counts, self.events = Counter(), Counter(), Counter(), Counter()
+        self.imported, self.failed = 0, 0
+
+        start = time.perf_counter()
+
+        chunks = iter_chunks(self.timed('read', records), options['chunk_size'])
+        if options['processes'] > 1:
+            # the database connections must not be shared with the worker processes
+            connections.close_all()
+
+            with ProcessPoolExecutor(options['processes'], initializer=django.setup) as executor:
+                # only a limited number of chunks is submitted at a time, so that the input
+                # is not read into memory completely
+                futures = set()
+                for chunk in chunks:
+                    futures.add(executor.submit(import_chunk, chunk, options['bulk'], options['dry_run']))
+                    if len(futures) >= 2 * options['processes']:
+                        done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self.add_result(future.result())
+
+                for future in wait(futures).done:
+                    self.add_result(future.result())
+        else:
+            for chunk in chunks:
+                self.add_result(import_chunk(chunk, options['bulk'], options['dry_run']))
+
+        elapsed = time.perf_counter() - start
+        rate = self.imported / elapsed if elapsed else 0
+
+        self.stdout.write(f'{self.imported} records imported, {self.failed} failed '
+                          f'in {elapsed:.2f}s ({rate:.1f} records/s).')
+        self.stdout.write(f'Resources: {self.counts["created"]} created, {self.counts["updated"]} updated, '
+                          f'{self.counts["unchanged"]} unchanged.')
+        self.stdout.write(f'Related items: {self.related_counts["created"]} created, '
+                          f'{self.related_counts["updated"]} updated, {self.related_counts["unchanged"]} unchanged.')
+        self.stdout.write(', '.join(f'{stage}: {seconds:.2f}s' for stage, seconds in self.timings.items()))
+
+        if options['verbosity'] > 1:
+            actions = {}
+            for (model, action), count in sorted(self.events.items()):
+                actions.setdefault(model, []).append(f'{count} {action}')
+            for model, model_actions in actions.items():
+                self.stdout.write(f'{model}: {", ".join(model_actions)}.')
+
+    def add_result(self, result):
+        imported, errors, timings, counts, related_counts, events, diffs = result
+
+        for diff in diffs:
+            if diff['action'] != 'unchanged':
+                self.stdout.write(json.dumps(diff, cls=DjangoJSONEncoder))
+
+        for source, error in errors:
+            self.stderr.write(f'{source}: {error}')
+
+        self.imported += imported
+        self.failed += len(errors)
+        self.timings.update(timings)
+        self.counts.update(counts)
+        self.related_counts.update(related_counts)
+        self.events.update(events)
+
+    def timed(self, stage, iterator):
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.timings[stage] += time.perf_counter() - start
+            yield item
+
+
+def import_chunk(chunk, bulk, dry_run=False):
+    imported, errors, timings = 0, [], Counter()
+
+    # the session is only used for one chunk, so that the memory does not grow during the import
+    session = ImportSession(dry_run=dry_run)
+
+    # the records are parsed first, so that the shared entities of the chunk can be fetched at once
+    start = time.perf_counter()
+    records = [(source, parse_record(record)) for source, record in chunk]
+    timings['parse'] += time.perf_counter() - start
+
+    if bulk:
+        start = time.perf_counter()
+        session.prefetch(get_valid_records(records))
+        timings['prefetch'] += time.perf_counter() - start
+
+    with transaction.atomic():
+        for index, (source, data) in enumerate(records):
+            try:
+                # every record uses a savepoint, so that a failed record does not roll back the chunk
+                with transaction.atomic():
+                    if isinstance(data, Exception):
+                        raise data
+
+                    start = time.perf_counter()
+                    import_resource(get_resource_instance(data), data, bulk=bulk, session=session)
+                    timings['import'] += time.perf_counter() - start
+
+                imported += 1
+            except Exception as e:
+                logger.exception('Import of %s failed', source)
+                errors.append((str(source), str(e)))
+
+                # entities of the rolled back record might be in the session
+                session.clear()
+                if bulk:
+                    session.prefetch(get_valid_records(records[index + 1:]))
+
+        commit_start = time.perf_counter()
+
+    # the on_commit callbacks (e.g. for the revisions) run when the atomic block is left
+    timings['commit'] += time.perf_counter() - commit_start
+
+    return imported, errors, timings, session.counts, session.related_counts, session.events, session.diffs
+
+
+def parse_record(record):
+    # records are JSON strings, already parsed XML or the error which occurred while reading,
+    # returns the data or the exception
+    if isinstance(record, Exception):
+        return record
+
+    try:
+        data = json.loads(record) if isinstance(record, str) else record
+        if not isinstance(data, dict):
+            raise ValueError('record is not a JSON object')
+        return data
+    except ValueError as e:
+        return e
+
+
+def get_valid_records(records):
+    return [data for source, data in records if not isinstance(data, Exception)]
+
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def iter_lines(source, fp):
+    for line_number, line in enumerate(fp, 1):
+        if line.strip():
+            yield f'{source}:{line_number}', line
+
+
+def iter_xml(source, fp):
+    # the XML is parsed while it is read, a document can contain any number of resources,
+    # an invalid resource is yielded as exception, but a malformed document ends the file
+    try:
+        for number, data in enumerate(XMLParser().iter_parse(fp), 1):
+            yield f'{source}:{number}', data
+    except ParseError as e:
+        yield source, e
+
+
+def iter_file(path, format):
+    if format == 'xml':
+        with path.open('rb') as fp:
+            yield from iter_xml(path, fp)
+    else:
+        with path.open(encoding='utf8') as fp:
+            yield from iter_lines(path, fp)
+
+
+def iter_files(path, format):
+    for file_path in sorted(path.rglob(f'*.{format}')):
+        if format == 'xml':
+            yield from iter_file(file_path, format)
+        else:
+            yield file_path, file_path.read_text(encoding='utf8')
@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ...models import Resource
+from ...snapshots import get_stale_resource_ids, update_snapshots
+from ...utils import get_settings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the snapshots of all resources or only of the stale ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Number of parallel processes (default: number of CPUs)')
+        parser.add_argument('--chunk-size', type=int, default=get_settings('DATACITE_EXPORT_CHUNK_SIZE'),
+                            help='Number of resources per process and chunk')
+        parser.add_argument('--stale', action='store_true',
+                            help='Only rebuild the snapshots which are missing or older than their resource')
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            resource_ids = list(get_stale_resource_ids())
+        else:
+            resource_ids = list(Resource.objects.order_by('pk').values_list('pk', flat=True))
+        chunk_size = options['chunk_size']
+        chunks = [resource_ids[i:i + chunk_size] for i in range(0, len(resource_ids), chunk_size)]
+
+        if options['processes'] > 1 and len(chunks) > 1:
+            # the database connections must not be shared with the worker processes
+            connections.close_all()
+
+            with ProcessPoolExecutor(options['processes'], initializer=django.setup) as executor:
+                list(executor.map(update_snapshots, chunks))
+        else:
+            for chunk in chunks:
+                update_snapshots(chunk)
+
+        self.stdout.write(f'{len(resource_ids)} snapshots updated.')
@@ -0,0 +1,51 @@
+from django.db import models
+
+
+def get_name_lookups(prefix):
+    return [
+        f'{prefix}__name__name_identifiers',
+        f'{prefix}__name__affiliations__name_identifiers'
+    ]
+
+
+# every relation which is used by exports.export_resource
+EXPORT_PREFETCH_LOOKUPS = (
+    'titles',
+    'descriptions',
+    'subjects',
+    'dates',
+    'rights_list',
+    *get_name_lookups('creator_set'),
+    *get_name_lookups('contributor_set'),
+    'alternateidentifier_set__identifier',
+    'relatedidentifier_set__identifier',
+    'geo_locations__geo_location_point',
+    'geo_locations__geo_location_box',
+    'geo_locations__geo_location_polygons',
+    'fundingreference_set__funder__name_identifiers',
+    'relateditem_set__item__identifier',
+    'relateditem_set__item__titles',
+    *get_name_lookups('relateditem_set__item__creator_set'),
+    *get_name_lookups('relateditem_set__item__contributor_set')
+)
+
+
+def prefetch_for_export(resources):
+    # same as ResourceQuerySet.for_export, but for already fetched resources,
+    # relations which are already prefetched are not fetched again
+    models.prefetch_related_objects(resources, 'identifier', *EXPORT_PREFETCH_LOOKUPS)
+
+
+class ResourceQuerySet(models.QuerySet):
+
+    def with_title(self):
+        # annotate the main title, which is then used by Resource.title instead of a query for every resource
+        title_model = self.model._meta.get_field('titles').related_model
+        return self.annotate(main_title=models.Subquery(
+            title_model.objects.filter(resource=models.OuterRef('pk'), title_type='').order_by('pk').values('title')[:1]
+        ))
+
+    def for_export(self):
+        # prefetch every relation which is used by exports.export_resource,
+        # so that the export runs with a fixed number of queries
+        return self.select_related('identifier').prefetch_related(*EXPORT_PREFETCH_LOOKUPS)
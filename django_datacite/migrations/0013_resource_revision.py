@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacite', '0012_alter_geolocation_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='modified_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
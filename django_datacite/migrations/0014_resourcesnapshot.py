@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacite', '0013_resource_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public', models.BooleanField(default=False)),
+                ('identifier', models.CharField(blank=True, db_index=True, max_length=256)),
+                ('identifier_type', models.CharField(blank=True, max_length=32)),
+                ('revision', models.PositiveIntegerField(default=0)),
+                ('json', models.TextField(blank=True)),
+                ('xml', models.TextField(blank=True)),
+                ('bibtex', models.TextField(blank=True)),
+                ('citation', models.TextField(blank=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('resource', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='datacite.resource')),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:19
+
+from django.db import migrations
+
+
+def run_data_migration(apps, schema_editor):
+    Resource = apps.get_model('datacite', 'Resource')
+    Identifier = apps.get_model('datacite', 'Identifier')
+    AlternateIdentifier = apps.get_model('datacite', 'AlternateIdentifier')
+    RelatedIdentifier = apps.get_model('datacite', 'RelatedIdentifier')
+    NameIdentifier = apps.get_model('datacite', 'NameIdentifier')
+
+    # merge duplicate identifiers into the first one
+    identifiers = {}
+    for identifier in Identifier.objects.order_by('pk'):
+        key = (identifier.identifier, identifier.identifier_type)
+        if key in identifiers:
+            Resource.objects.filter(identifier=identifier).update(identifier=identifiers[key])
+            AlternateIdentifier.objects.filter(identifier=identifier).update(identifier=identifiers[key])
+            RelatedIdentifier.objects.filter(identifier=identifier).update(identifier=identifiers[key])
+            identifier.delete()
+        else:
+            identifiers[key] = identifier
+
+    # remove duplicate name identifiers, the first one is kept, the names of the removed name identifiers
+    # are not merged into the name of the kept one, since this would change the creators and contributors
+    # of resources, they remain as separate names (possibly without any name identifier) and need to be
+    # merged manually if necessary
+    name_identifiers = set()
+    for name_identifier in NameIdentifier.objects.order_by('pk'):
+        key = (name_identifier.name_identifier, name_identifier.name_identifier_scheme)
+        if key in name_identifiers:
+            name_identifier.delete()
+        else:
+            name_identifiers.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacite', '0014_resourcesnapshot'),
+    ]
+
+    # the unique constraints are added in the next migration, in a separate transaction, since
+    # PostgreSQL cannot alter a table with pending trigger events from the deletions above
+    operations = [
+        migrations.RunPython(run_data_migration, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datacite', '0015_merge_duplicate_identifiers'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='identifier',
+            constraint=models.UniqueConstraint(fields=('identifier', 'identifier_type'), name='datacite_identifier_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='nameidentifier',
+            constraint=models.UniqueConstraint(fields=('name_identifier', 'name_identifier_scheme'), name='datacite_name_identifier_unique'),
+        ),
+    ]
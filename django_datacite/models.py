@@ -4,14 +4,35 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.http import Http404
 from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.text import Truncator
 
-from .utils import get_display_name, get_settings, render_citation, update_version
+from .managers import ResourceQuerySet
+from .utils import get_display_name, get_settings, render_citation
 from .validators import validate_polygon_points, validate_resource
 
 
-class Resource(models.Model):
+class CitationFieldsMixin:
+    # tracks the fields which are used by the citations, the resources
+    # are marked by django_datacite.signals if one of them has changed
+    citation_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.citation_values = instance.get_citation_values()
+        return instance
+
+    def get_citation_values(self):
+        # deferred fields are not loaded
+        return {field_name: self.__dict__.get(field_name) for field_name in self.citation_fields}
+
+    def has_citation_changed(self):
+        return self._state.adding or getattr(self, 'citation_values', None) != self.get_citation_values()
+
+
+class Resource(CitationFieldsMixin, models.Model):
 
     public = models.BooleanField(
         default=False
@@ -52,6 +73,12 @@ class Resource(models.Model):
     cite_version = models.BooleanField(
         default=True
     )
+    revision = models.PositiveIntegerField(
+        default=0, editable=False
+    )
+    modified_at = models.DateTimeField(
+        default=timezone.now, editable=False
+    )
     creators = models.ManyToManyField(
         'Name', through='Creator', blank=True, related_name='as_creator'
     )
@@ -77,163 +104,54 @@ class Resource(models.Model):
         'Resource', through='RelatedItem', blank=True, related_name='as_related_item'
     )
 
+    objects = ResourceQuerySet.as_manager()
+
+    citation_fields = (
+        'identifier_id',
+        'publisher',
+        'publication_year',
+        'resource_type_general',
+        'version',
+        'cite_publisher',
+        'cite_resource_type_general',
+        'cite_version'
+    )
+
     def __str__(self):
         return f'{self.identifier}'
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # revision and modified_at are only updated by django_datacite.signals,
+            # a stale instance must not overwrite them
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('revision', 'modified_at')
+            ]
 
-        if self.identifier:
-            self.identifier.citation = self.citation
-            self.identifier.save()
+        super().save(*args, **kwargs)
 
     def copy(self):
-        # create and save new instance
-        resource = Resource(
-            identifier=None,
-            publisher=self.publisher,
-            publication_year=self.publication_year,
-            resource_type=self.resource_type,
-            resource_type_general=self.resource_type_general,
-            language=self.language,
-            size=self.size,
-            format=self.format,
-            version=self.version,
-            cite_publisher=self.cite_publisher,
-            cite_resource_type_general=self.cite_resource_type_general,
-            cite_version=self.cite_version
-        )
-        resource.save()
-
-        # copy related instances
-        for title in self.titles.all():
-            Title(
-                resource=resource,
-                title=title.title,
-                title_type=title.title_type
-            ).save()
-        for description in self.descriptions.all():
-            Description(
-                resource=resource,
-                description=description.description,
-                description_type=description.description_type
-            ).save()
-        for creator in self.creator_set.all():
-            Creator(
-                resource=resource,
-                name=creator.name,
-                order=creator.order
-            ).save()
-        for contributor in self.contributor_set.all():
-            Contributor(
-                resource=resource,
-                name=contributor.name,
-                order=contributor.order,
-                contributor_type=contributor.contributor_type
-            ).save()
-        for subject in self.subjects.all():
-            resource.subjects.add(subject)
-        for date in self.dates.all():
-            Date(
-                resource=resource,
-                date=date.date,
-                date_type=date.date_type
-            ).save()
-        for alternate_identifier in self.alternateidentifier_set.all():
-            AlternateIdentifier(
-                resource=resource,
-                identifier=alternate_identifier.identifier,
-                order=alternate_identifier.order
-            ).save()
-        for related_identifier in self.relatedidentifier_set.all():
-            RelatedIdentifier(
-                resource=resource,
-                identifier=related_identifier.identifier,
-                order=related_identifier.order,
-                relation_type=related_identifier.relation_type,
-                resource_type_general=related_identifier.resource_type_general
-            ).save()
-        for rights in self.rights_list.all():
-            Rights(
-                resource=resource,
-                rights_identifier=rights.rights_identifier
-            ).save()
-        for geo_location in self.geo_locations.all():
-            resource.geo_locations.add(geo_location)
-        for funding_reference in self.fundingreference_set.all():
-            FundingReference(
-                resource=resource,
-                funder=funding_reference.funder,
-                award_number=funding_reference.award_number,
-                award_uri=funding_reference.award_uri,
-                award_title=funding_reference.award_title
-            ).save()
-        for related_item in self.relateditem_set.all():
-            RelatedItem(
-                resource=resource,
-                item=related_item.item,
-                relation_type=related_item.relation_type,
-                volume=related_item.volume,
-                issue=related_item.issue,
-                number=related_item.number,
-                number_type=related_item.number_type,
-                first_page=related_item.first_page,
-                last_page=related_item.last_page,
-                edition=related_item.edition
-            ).save()
-
-        return resource
+        # the import is deferred, since the copies module depends on the signals, which depend on the models
+        from .copies import copy_resources
+        return copy_resources([self])[0]
 
     def create_new_version(self):
-        resource = self.copy()
-
-        if self.identifier is not None:
-            # create the new identifier
-            identifier = Identifier(
-                identifier=update_version(self.identifier.identifier),
-                identifier_type=self.identifier.identifier_type
-            )
-            identifier.save()
-
-            # update the version if there is one set
-            if self.version:
-                resource.version = update_version(self.version)
-
-            # store the identifier in the resource
-            resource.identifier = identifier
-            resource.save()
-
-            # remove any old IsNewVersionOf related identifier for the new resource
-            RelatedIdentifier.objects.filter(
-                resource=resource,
-                relation_type='IsNewVersionOf',
-            ).delete()
-
-            # create a related identifer on the new resource for the current resource
-            RelatedIdentifier(
-                resource=resource,
-                identifier=self.identifier,
-                order=get_settings('DATACITE_NEW_VERSION_ORDER'),
-                relation_type='IsNewVersionOf',
-                resource_type_general='Dataset'
-            ).save()
-
-            # create a related identifer on the current resource for the new resource
-            RelatedIdentifier(
-                resource=self,
-                identifier=identifier,
-                order=get_settings('DATACITE_PREVIOUS_VERSION_ORDER'),
-                relation_type='IsPreviousVersionOf',
-                resource_type_general='Dataset'
-            ).save()
-
-        return resource
+        from .copies import create_new_version
+        return create_new_version(self)
 
     def validate(self):
         return validate_resource(self)
 
     @cached_property
     def title(self):
+        # use the annotated main title (ResourceQuerySet.with_title) or the prefetched titles, if available
+        if 'main_title' in self.__dict__:
+            return self.main_title
+
+        if 'titles' in getattr(self, '_prefetched_objects_cache', {}):
+            return next((title.title for title in self.titles.all() if title.title_type == ''), None)
+
         main_title = self.titles.filter(title_type='').first()
         if main_title:
             return main_title.title
@@ -281,7 +199,7 @@ class Resource(models.Model):
         return language in dict(cls.get_language_choices())
 
 
-class Identifier(models.Model):
+class Identifier(CitationFieldsMixin, models.Model):
 
     identifier = models.CharField(
         max_length=256
@@ -293,6 +211,14 @@ class Identifier(models.Model):
         blank=True
     )
 
+    citation_fields = ('identifier', 'identifier_type')
+
+    class Meta:
+        constraints = [
+            # allows concurrent imports to create identifiers without duplicates
+            models.UniqueConstraint(fields=('identifier', 'identifier_type'), name='datacite_identifier_unique')
+        ]
+
     def __str__(self):
         return f'({self.identifier_type}) {self.url}'
 
@@ -321,7 +247,7 @@ class Identifier(models.Model):
         return identifier_type in dict(cls.get_identifier_type_choices())
 
 
-class Name(models.Model):
+class Name(CitationFieldsMixin, models.Model):
 
     name = models.CharField(
         max_length=256
@@ -339,6 +265,8 @@ class Name(models.Model):
         'Name', blank=True, related_name='as_affiliation'
     )
 
+    citation_fields = ('name', 'given_name', 'family_name')
+
     @staticmethod
     def get_default_name_type():
         return get_settings('DATACITE_DEFAULT_NAME_TYPE')
@@ -371,6 +299,13 @@ class NameIdentifier(models.Model):
         max_length=32
     )
 
+    class Meta:
+        constraints = [
+            # allows concurrent imports to create name identifiers without duplicates
+            models.UniqueConstraint(fields=('name_identifier', 'name_identifier_scheme'),
+                                    name='datacite_name_identifier_unique')
+        ]
+
     def __str__(self):
         return f'({self.name_identifier_scheme}) {self.name_identifier}'
 
@@ -448,7 +383,7 @@ class Contributor(models.Model):
         return contributor_type in dict(cls.get_contributor_type_choices())
 
 
-class Title(models.Model):
+class Title(CitationFieldsMixin, models.Model):
 
     resource = models.ForeignKey(
         'Resource', related_name='titles', on_delete=models.CASCADE,
@@ -460,6 +395,8 @@ class Title(models.Model):
         max_length=32, blank=True
     )
 
+    citation_fields = ('title', 'title_type')
+
     class Meta:
         ordering = ('title_type', )
 
@@ -867,3 +804,44 @@ class RelatedItem(models.Model):
     @classmethod
     def validate_number_type(cls, number_type):
         return number_type in dict(cls.get_number_type_choices())
+
+
+class ResourceSnapshot(models.Model):
+
+    resource = models.OneToOneField(
+        'Resource', related_name='snapshot', on_delete=models.CASCADE
+    )
+    public = models.BooleanField(
+        default=False
+    )
+    identifier = models.CharField(
+        max_length=256, blank=True, db_index=True
+    )
+    identifier_type = models.CharField(
+        max_length=32, blank=True
+    )
+    revision = models.PositiveIntegerField(
+        default=0
+    )
+    json = models.TextField(
+        blank=True
+    )
+    xml = models.TextField(
+        blank=True
+    )
+    bibtex = models.TextField(
+        blank=True
+    )
+    citation = models.TextField(
+        blank=True
+    )
+    updated = models.DateTimeField(
+        auto_now=True
+    )
+
+    def __str__(self):
+        return f'{self.resource}'
+
+    @property
+    def filename(self):
+        return str(Identifier(identifier=self.identifier, identifier_type=self.identifier_type))
@@ -0,0 +1,256 @@
+from xml.etree.ElementTree import iterparse
+
+
+class XMLParser:
+    # the inverse of renderers.XMLRenderer: parses DataCite XML into the
+    # data structure of exports.export_resource and imports.import_resource
+
+    def parse(self, stream):
+        for data in self.iter_parse(stream):
+            if isinstance(data, Exception):
+                raise data
+            return data
+
+    def iter_parse(self, stream):
+        # yield the data of every resource element, e.g. in a single resource document,
+        # a collection or an OAI-PMH response, elements are cleared after they are parsed,
+        # for an invalid resource (e.g. a non-numeric point) the exception is yielded instead
+        stack = []
+        resource_depth = 0
+        for event, element in iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                if get_tag(element) == 'resource':
+                    resource_depth += 1
+            else:
+                stack.pop()
+                if get_tag(element) == 'resource':
+                    resource_depth -= 1
+                    try:
+                        data = self.parse_resource(element)
+                    except ValueError as e:
+                        data = e
+                    yield data
+
+                if resource_depth == 0:
+                    # only the element and its ancestors are kept in memory
+                    element.clear()
+                    if stack:
+                        stack[-1].remove(element)
+
+    def parse_resource(self, element):
+        data = {
+            'schemaVersion': 'http://datacite.org/schema/kernel-4'
+        }
+
+        for child in element:
+            tag = get_tag(child)
+
+            if tag == 'identifier':
+                data['identifiers'] = [{
+                    'identifier': get_text(child),
+                    'identifierType': child.get('identifierType')
+                }]
+
+            elif tag == 'creators':
+                data['creators'] = [self.parse_name('creator', node) for node in find_all(child, 'creator')]
+
+            elif tag == 'titles':
+                data['titles'] = [
+                    get_attrs(node, 'titleType', title=get_text(node)) for node in find_all(child, 'title')
+                ]
+
+            elif tag in ('publisher', 'publicationYear', 'language', 'size', 'format', 'version'):
+                data[tag] = get_text(child)
+
+            elif tag in ('sizes', 'formats'):
+                # kernel-4 allows a list of sizes and formats, the resource stores only the first one
+                nodes = find_all(child, tag[:-1])
+                if nodes:
+                    data[tag[:-1]] = get_text(nodes[0])
+
+            elif tag == 'resourceType':
+                data['types'] = get_attrs(child, 'resourceTypeGeneral', resourceType=get_text(child))
+
+            elif tag == 'subjects':
+                data['subjects'] = [
+                    get_attrs(node, 'subjectScheme', 'schemeURI', 'valueURI', 'classificationCode',
+                              subject=get_text(node))
+                    for node in find_all(child, 'subject')
+                ]
+
+            elif tag == 'contributors':
+                data['contributors'] = [self.parse_name('contributor', node)
+                                        for node in find_all(child, 'contributor')]
+
+            elif tag == 'dates':
+                data['dates'] = [
+                    get_attrs(node, 'dateType', 'dateInformation', date=get_text(node))
+                    for node in find_all(child, 'date')
+                ]
+
+            elif tag == 'alternateIdentifiers':
+                data['alternateIdentifiers'] = [
+                    get_attrs(node, 'alternateIdentifierType', alternateIdentifier=get_text(node))
+                    for node in find_all(child, 'alternateIdentifier')
+                ]
+
+            elif tag == 'relatedIdentifiers':
+                data['relatedIdentifiers'] = [
+                    get_attrs(node, 'relatedIdentifierType', 'relationType', 'resourceTypeGeneral',
+                              relatedIdentifier=get_text(node))
+                    for node in find_all(child, 'relatedIdentifier')
+                ]
+
+            elif tag == 'rightsList':
+                data['rightsList'] = [
+                    get_attrs(node, 'rightsURI', 'rightsIdentifier', 'rightsIdentifierScheme', 'schemeURI',
+                              rights=get_text(node))
+                    for node in find_all(child, 'rights')
+                ]
+
+            elif tag == 'descriptions':
+                data['descriptions'] = [
+                    get_attrs(node, 'descriptionType', description=get_text(node))
+                    for node in find_all(child, 'description')
+                ]
+
+            elif tag == 'geoLocations':
+                data['geoLocations'] = [self.parse_geo_location(node) for node in find_all(child, 'geoLocation')]
+
+            elif tag == 'fundingReferences':
+                data['fundingReferences'] = [self.parse_funding_reference(node)
+                                             for node in find_all(child, 'fundingReference')]
+
+            elif tag == 'relatedItems':
+                data['relatedItems'] = [self.parse_related_item(node) for node in find_all(child, 'relatedItem')]
+
+        return data
+
+    def parse_name(self, tag, element):
+        data = get_attrs(element, 'contributorType')
+
+        for child in element:
+            child_tag = get_tag(child)
+
+            if child_tag == f'{tag}Name':
+                data['name'] = get_text(child)
+                data.update(get_attrs(child, 'nameType'))
+
+            elif child_tag in ('givenName', 'familyName'):
+                data[child_tag] = get_text(child)
+
+            elif child_tag == 'nameIdentifier':
+                data.setdefault('nameIdentifiers', []).append(
+                    get_attrs(child, 'nameIdentifierScheme', 'schemeURI', nameIdentifier=get_text(child))
+                )
+
+            elif child_tag == 'affiliation':
+                data.setdefault('affiliations', []).append(
+                    get_attrs(child, 'affiliationIdentifier', 'affiliationIdentifierScheme', 'schemeURI',
+                              affiliation=get_text(child))
+                )
+
+        return data
+
+    def parse_geo_location(self, element):
+        data = {}
+
+        for child in element:
+            tag = get_tag(child)
+
+            if tag == 'geoLocationPlace':
+                data['geoLocationPlace'] = get_text(child)
+
+            elif tag == 'geoLocationPoint':
+                data['geoLocationPoint'] = get_numbers(child)
+
+            elif tag == 'geoLocationBox':
+                data['geoLocationBox'] = get_numbers(child)
+
+            elif tag == 'geoLocationPolygon':
+                polygon = {
+                    'polygonPoints': [get_numbers(node) for node in find_all(child, 'polygonPoint')]
+                }
+                for node in find_all(child, 'inPolygonPoint'):
+                    polygon['inPolygonPoint'] = get_numbers(node)
+
+                data.setdefault('geoLocationPolygons', []).append(polygon)
+
+        return data
+
+    def parse_funding_reference(self, element):
+        data = {}
+
+        for child in element:
+            tag = get_tag(child)
+
+            if tag in ('funderName', 'awardNumber', 'awardURI', 'awardTitle'):
+                data[tag] = get_text(child)
+
+            elif tag == 'funderIdentifier':
+                data['funderIdentifier'] = get_text(child)
+                data.update(get_attrs(child, 'funderIdentifierType', 'schemeURI'))
+
+        return data
+
+    def parse_related_item(self, element):
+        data = get_attrs(element, 'relatedItemType', 'relationType')
+
+        for child in element:
+            tag = get_tag(child)
+
+            if tag == 'relatedItemIdentifier':
+                data['relatedItemIdentifier'] = get_text(child)
+                data.update(get_attrs(child, 'relatedItemIdentifierType'))
+
+            elif tag == 'creators':
+                data['creators'] = [self.parse_name('creator', node) for node in find_all(child, 'creator')]
+
+            elif tag == 'titles':
+                data['titles'] = [
+                    get_attrs(node, 'titleType', title=get_text(node)) for node in find_all(child, 'title')
+                ]
+
+            elif tag in ('publicationYear', 'volume', 'issue', 'firstPage', 'lastPage', 'publisher', 'edition'):
+                data[tag] = get_text(child)
+
+            elif tag == 'number':
+                data['number'] = get_text(child)
+                data.update(get_attrs(child, 'numberType'))
+
+            elif tag == 'contributors':
+                data['contributors'] = [self.parse_name('contributor', node)
+                                        for node in find_all(child, 'contributor')]
+
+        return data
+
+
+def get_tag(element):
+    # remove the namespace, e.g. {http://datacite.org/schema/kernel-4}resource
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def get_text(element):
+    return element.text or ''
+
+
+def get_attrs(element, *keys, **values):
+    attrs = {key: element.get(key) for key in keys if element.get(key) is not None}
+    return {**values, **attrs}
+
+
+def get_numbers(element):
+    return {get_tag(child): get_number(get_text(child)) for child in element}
+
+
+def get_number(text):
+    # the inverse of str(), e.g. polygon points are stored as given, i.e. as int or float
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def find_all(element, tag):
+    return [child for child in element if get_tag(child) == tag]
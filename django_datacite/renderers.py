@@ -1,20 +1,118 @@
 import io
-from xml.dom.minidom import parseString
-from xml.sax.saxutils import XMLGenerator
+from xml.dom import minidom
+
+
+def get_minidom_escape_table(attr=False):
+    # the escaping of minidom differs between python versions (e.g. for quotes in text
+    # or for whitespace in attributes), so it is looked up once using minidom itself
+    table = {}
+    for char in '&<>"\r\n\t':
+        stream = io.StringIO()
+        if attr:
+            element = minidom.Document().createElement('x')
+            element.setAttribute('a', char)
+            element.writexml(stream)
+            table[ord(char)] = stream.getvalue()[len('<x a="'):-len('"/>')]
+        else:
+            minidom.Document().createTextNode(char).writexml(stream)
+            table[ord(char)] = stream.getvalue()
+    return table
+
+
+class PrettyXMLGenerator:
+    # writes indented xml in a single pass, with the same output as
+    # XMLGenerator followed by parseString(...).toprettyxml(indent='    ')
+
+    text_escape_table = get_minidom_escape_table()
+    attr_escape_table = get_minidom_escape_table(attr=True)
+
+    def __init__(self, stream, indent='    '):
+        self.stream = stream
+        self.indent = indent
+        self.depth = 0
+        self.start_tag = None
+        self.text = []
+
+    def startDocument(self):
+        self.stream.write('<?xml version="1.0" ?>\n')
+
+    def endDocument(self):
+        pass
+
+    def startElement(self, name, attrs):
+        if self.start_tag is not None:
+            # the parent element has child elements
+            self.stream.write(self.start_tag + '>\n')
+
+        self.start_tag = self.indent * self.depth + '<' + name + ''.join(
+            f' {key}="{value.translate(self.attr_escape_table)}"' for key, value in attrs.items()
+        )
+        self.text = []
+        self.depth += 1
+
+    def endElement(self, name):
+        self.depth -= 1
+
+        if self.start_tag is None:
+            self.stream.write(f'{self.indent * self.depth}</{name}>\n')
+        elif self.text:
+            # line breaks in text are normalized by the xml parser
+            text = ''.join(self.text).replace('\r\n', '\n').replace('\r', '\n')
+            self.stream.write(f'{self.start_tag}>{text.translate(self.text_escape_table)}</{name}>\n')
+        else:
+            self.stream.write(self.start_tag + '/>\n')
+
+        self.start_tag = None
+        self.text = []
+
+    def characters(self, content):
+        if content:
+            self.text.append(content)
 
 
 class XMLRenderer:
 
-    def __init__(self):
-        self.stream = io.StringIO()
-        self.xml = XMLGenerator(self.stream, 'utf-8')
+    def __init__(self, stream=None):
+        # without a stream, the xml is collected and returned by render
+        self.return_value = stream is None
+        self.stream = io.StringIO() if stream is None else stream
+        self.xml = PrettyXMLGenerator(self.stream)
 
     def render(self, data):
         self.data = data
         self.render_document()
 
-        dom = parseString(self.stream.getvalue())
-        return dom.toprettyxml(indent='    ')
+        if self.return_value:
+            return self.stream.getvalue()
+
+    def render_collection(self, data):
+        value = ''.join(self.iter_render_collection(data))
+        if self.return_value:
+            return value
+
+    def iter_render_collection(self, data):
+        # render an iterable of resources into one document and yield
+        # the xml after each resource, so it can be streamed
+        self.xml.startDocument()
+        self.xml.startElement('resources', {})
+
+        for resource_data in data:
+            self.data = resource_data
+            self.render_record()
+            yield self.flush()
+
+        self.xml.endElement('resources')
+        self.xml.endDocument()
+        yield self.flush()
+
+    def flush(self):
+        if self.return_value:
+            value = self.stream.getvalue()
+            self.stream.seek(0)
+            self.stream.truncate()
+            return value
+        else:
+            return ''
 
     def render_node(self, tag, attrs, value):
         if value is not None:
@@ -30,6 +128,10 @@ class XMLRenderer:
         self.render_resource()
         self.xml.endDocument()
 
+    def render_record(self):
+        # can be overridden to wrap each resource in a collection, e.g. in an OAI-PMH envelope
+        self.render_resource()
+
     def render_resource(self):
         self.xml.startElement('resource', {
             'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
@@ -7,6 +7,20 @@ DATACITE_VERSION_PATTERN = r'\d{1,3}'
 DATACITE_PREVIOUS_VERSION_ORDER = 1000
 DATACITE_NEW_VERSION_ORDER = 2000
 
+DATACITE_EXPORT_CHUNK_SIZE = 100
+DATACITE_IMPORT_CHUNK_SIZE = 100
+DATACITE_CITATION_CHUNK_SIZE = 1000
+DATACITE_IMPORT_MAX_WORKERS = 8
+DATACITE_IMPORT_TIMEOUT = 10
+DATACITE_IMPORT_RETRIES = 3
+DATACITE_IMPORT_BACKOFF = 0.5
+
+DATACITE_CACHE = None
+DATACITE_CACHE_TIMEOUT = 86400
+
+DATACITE_SNAPSHOTS = False
+DATACITE_SNAPSHOTS_DEFERRED = False
+
 DATACITE_DEFAULT_IDENTIFIER_TYPE = 'DOI'
 DATACITE_IDENTIFIER_TYPES = (
     ('ARK', _('ARK')),
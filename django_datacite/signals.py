@@ -0,0 +1,318 @@
+import threading
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .cache import delete_cached
+from .models import (
+    AlternateIdentifier,
+    Contributor,
+    Creator,
+    Date,
+    Description,
+    FundingReference,
+    GeoLocation,
+    GeoLocationBox,
+    GeoLocationPoint,
+    GeoLocationPolygon,
+    Identifier,
+    Name,
+    NameIdentifier,
+    RelatedIdentifier,
+    RelatedItem,
+    Resource,
+    Rights,
+    Subject,
+    Title,
+)
+from .snapshots import update_snapshots
+from .utils import get_settings
+
+local = threading.local()
+
+# sent after the revision of resources was updated, provides resource_ids and using
+resources_changed = Signal()
+
+
+class ResourceChangeBatch:
+
+    def __init__(self, using):
+        self.using = using
+        self.resource_ids = set()
+        self.citation_resource_ids = set()
+        self.flushed = False
+
+    def is_pending(self):
+        # on_commit callbacks are discarded by django if the transaction (or the savepoint
+        # in which the callback was registered) is rolled back, a new batch is needed then,
+        # since django has no hook for rollbacks, the pending callbacks of the connection are
+        # searched, the membership test does not depend on the layout of their tuples, which
+        # changed between django versions, e.g. (savepoint_ids, func, robust) since 4.2,
+        # test_resource_change_batch_pending pins this for the supported django versions
+        if self.flushed:
+            return False
+
+        # if the callbacks cannot be found, a new batch is used for every change, which is
+        # safe, the revisions are then updated once per change instead of once per transaction
+        run_on_commit = getattr(transaction.get_connection(self.using), 'run_on_commit', None)
+        return run_on_commit is not None and any(self.flush in callback for callback in run_on_commit)
+
+    def flush(self):
+        self.flushed = True
+
+        # the citations are updated first, so that the resources which use the
+        # identifiers of these citations are updated in the same batch
+        self.resource_ids.update(update_citations(self.citation_resource_ids, self.using))
+        if self.resource_ids:
+            update_revisions(self.resource_ids, self.using)
+
+
+def get_batch(using=None):
+    # returns None if there is no transaction, the changes need to be handled right away then
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+
+    # collect the changed resources and handle them once, when the transaction is committed
+    batches = local.__dict__.setdefault('batches', {})
+    batch = batches.get(connection.alias)
+    if batch is None or not batch.is_pending():
+        batch = batches[connection.alias] = ResourceChangeBatch(connection.alias)
+        transaction.on_commit(batch.flush, using=connection.alias)
+
+    return batch
+
+
+def mark_resources_changed(resource_ids, using=None):
+    resource_ids = {resource_id for resource_id in resource_ids if resource_id is not None}
+    if not resource_ids:
+        return
+
+    batch = get_batch(using)
+    if batch is None:
+        update_revisions(resource_ids, transaction.get_connection(using).alias)
+    else:
+        batch.resource_ids.update(resource_ids)
+
+
+def mark_citations_changed(resource_ids, using=None):
+    resource_ids = {resource_id for resource_id in resource_ids if resource_id is not None}
+    if not resource_ids:
+        return
+
+    batch = get_batch(using)
+    if batch is None:
+        mark_resources_changed(update_citations(resource_ids, transaction.get_connection(using).alias), using)
+    else:
+        batch.citation_resource_ids.update(resource_ids)
+
+
+def update_revisions(resource_ids, using=None):
+    # resources which use a changed resource as related item are changed as well
+    resource_ids = list(Resource.objects.using(using).filter(
+        Q(pk__in=resource_ids) |
+        Q(pk__in=RelatedItem.objects.using(using).filter(item__in=resource_ids).values('resource'))
+    ).values_list('pk', flat=True))
+
+    Resource.objects.using(using).filter(pk__in=resource_ids) \
+                                 .update(revision=F('revision') + 1, modified_at=timezone.now())
+
+    resources_changed.send(sender=Resource, resource_ids=resource_ids, using=using)
+
+
+def update_citations(resource_ids, using=None):
+    # render the citations once all related rows are written, the identifiers are only written
+    # if their citation has changed, returns the resources which use the changed identifiers
+    resource_ids = sorted(resource_ids)
+    chunk_size = get_settings('DATACITE_CITATION_CHUNK_SIZE')
+
+    changed_resource_ids = []
+    for index in range(0, len(resource_ids), chunk_size):
+        # the resources are handled in chunks, e.g. if a name of many creators has changed
+        resources = Resource.objects.using(using).filter(pk__in=resource_ids[index:index + chunk_size]) \
+                                    .exclude(identifier=None) \
+                                    .select_related('identifier').with_title() \
+                                    .prefetch_related('creator_set__name')
+
+        identifiers = []
+        for resource in resources:
+            if resource.identifier.citation != resource.citation:
+                resource.identifier.citation = resource.citation
+                identifiers.append(resource.identifier)
+
+        if identifiers:
+            Identifier.objects.using(using).bulk_update(identifiers, ['citation'])
+
+            changed_resource_ids += Resource.objects.using(using).filter(
+                Q(identifier__in=identifiers) |
+                Q(pk__in=AlternateIdentifier.objects.using(using).filter(identifier__in=identifiers)
+                                                                 .values('resource')) |
+                Q(pk__in=RelatedIdentifier.objects.using(using).filter(identifier__in=identifiers)
+                                                               .values('resource'))
+            ).values_list('pk', flat=True)
+
+    return changed_resource_ids
+
+
+def get_resource_ids(instance, using=None):
+    if isinstance(instance, Resource):
+        return [instance.pk]
+
+    elif isinstance(instance, (Title, Description, Creator, Contributor, Date, AlternateIdentifier,
+                               RelatedIdentifier, Rights, FundingReference, RelatedItem)):
+        return [instance.resource_id]
+
+    elif isinstance(instance, Identifier):
+        return Resource.objects.using(using).filter(
+            Q(identifier=instance) |
+            Q(pk__in=AlternateIdentifier.objects.using(using).filter(identifier=instance).values('resource')) |
+            Q(pk__in=RelatedIdentifier.objects.using(using).filter(identifier=instance).values('resource'))
+        ).values_list('pk', flat=True)
+
+    elif isinstance(instance, Name):
+        return get_name_resource_ids(instance.pk, using)
+
+    elif isinstance(instance, NameIdentifier):
+        return get_name_resource_ids(instance.name_id, using)
+
+    elif isinstance(instance, (Subject, GeoLocation)):
+        return instance.resources.using(using).values_list('pk', flat=True)
+
+    elif isinstance(instance, (GeoLocationPoint, GeoLocationBox, GeoLocationPolygon)):
+        return Resource.objects.using(using).filter(geo_locations=instance.geo_location_id) \
+                                            .values_list('pk', flat=True)
+
+    return []
+
+
+def get_name_resource_ids(name_id, using=None):
+    # the name itself and all names which use the name as affiliation
+    name_ids = Name.objects.using(using).filter(Q(pk=name_id) | Q(affiliations=name_id)).values('pk')
+
+    return Resource.objects.using(using).filter(
+        Q(pk__in=Creator.objects.using(using).filter(name__in=name_ids).values('resource')) |
+        Q(pk__in=Contributor.objects.using(using).filter(name__in=name_ids).values('resource')) |
+        Q(pk__in=FundingReference.objects.using(using).filter(funder__in=name_ids).values('resource'))
+    ).values_list('pk', flat=True)
+
+
+def handle_save(sender, instance, created=False, raw=False, using=None, **kwargs):
+    if raw:
+        return
+
+    if created and isinstance(instance, (Identifier, Name, Subject, GeoLocation)):
+        # no resource can use a shared entity which was just created, unlike a new
+        # name identifier, which changes the resources of its (existing) name
+        return
+
+    mark_resources_changed(get_resource_ids(instance, using), using)
+
+
+def get_citation_resource_ids(instance, using=None):
+    # the resources whose citation uses the instance
+    if isinstance(instance, Resource):
+        return [instance.pk]
+
+    elif isinstance(instance, Creator):
+        return [instance.resource_id]
+
+    elif isinstance(instance, Title):
+        # only the main title is used, also if the title was the main title before
+        if instance.title_type == '' or getattr(instance, 'citation_values', {}).get('title_type') == '':
+            return [instance.resource_id]
+
+    elif isinstance(instance, Identifier):
+        return Resource.objects.using(using).filter(identifier=instance).values_list('pk', flat=True)
+
+    elif isinstance(instance, Name):
+        return Creator.objects.using(using).filter(name=instance).values_list('resource', flat=True)
+
+    return []
+
+
+def handle_citation_pre_save(sender, instance, raw=False, **kwargs):
+    # the changed fields are only known before the instance is saved
+    instance.citation_changed = not raw and instance.has_citation_changed()
+
+
+def handle_citation_post_save(sender, instance, created=False, raw=False, using=None, **kwargs):
+    # no resource can use an identifier or a name which was just created
+    if instance.citation_changed and not (created and isinstance(instance, (Identifier, Name))):
+        mark_citations_changed(get_citation_resource_ids(instance, using), using)
+    instance.citation_values = instance.get_citation_values()
+
+
+def handle_citation_delete(sender, instance, using=None, **kwargs):
+    mark_citations_changed(get_citation_resource_ids(instance, using), using)
+
+
+def handle_creator_save(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        mark_citations_changed([instance.resource_id], using)
+
+
+def handle_creators_m2m_changed(sender, instance, action, reverse, model, pk_set, using=None, **kwargs):
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        if reverse and pk_set is not None:
+            # e.g. name.as_creator.add(...), pk_set contains the resources
+            mark_citations_changed(pk_set, using)
+        elif reverse:
+            mark_citations_changed(Creator.objects.using(using).filter(name=instance)
+                                                  .values_list('resource', flat=True), using)
+        else:
+            mark_citations_changed([instance.pk], using)
+
+
+def handle_delete(sender, instance, using=None, **kwargs):
+    mark_resources_changed(get_resource_ids(instance, using), using)
+
+
+def handle_m2m_changed(sender, instance, action, reverse, model, pk_set, using=None, **kwargs):
+    if action in ('post_add', 'post_remove') and not pk_set:
+        # e.g. add() with instances which were already related
+        return
+
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        if reverse and model is Resource and pk_set is not None:
+            # e.g. subject.resources.add(...), pk_set contains the resources
+            mark_resources_changed(pk_set, using)
+        else:
+            mark_resources_changed(get_resource_ids(instance, using), using)
+
+
+for model in (Resource, Identifier, Name, NameIdentifier, Creator, Contributor, Title, Description,
+              Subject, Date, AlternateIdentifier, RelatedIdentifier, Rights, GeoLocation, GeoLocationPoint,
+              GeoLocationBox, GeoLocationPolygon, FundingReference, RelatedItem):
+    post_save.connect(handle_save, sender=model, dispatch_uid=f'datacite_save_{model._meta.model_name}')
+    pre_delete.connect(handle_delete, sender=model, dispatch_uid=f'datacite_delete_{model._meta.model_name}')
+
+for model in (Resource, Identifier, Name, Title):
+    pre_save.connect(handle_citation_pre_save, sender=model,
+                     dispatch_uid=f'datacite_citation_pre_save_{model._meta.model_name}')
+    post_save.connect(handle_citation_post_save, sender=model,
+                      dispatch_uid=f'datacite_citation_save_{model._meta.model_name}')
+
+for model in (Creator, Title, Name):
+    pre_delete.connect(handle_citation_delete, sender=model,
+                       dispatch_uid=f'datacite_citation_delete_{model._meta.model_name}')
+
+post_save.connect(handle_creator_save, sender=Creator, dispatch_uid='datacite_citation_save_creator')
+m2m_changed.connect(handle_creators_m2m_changed, sender=Creator, dispatch_uid='datacite_citation_m2m_changed_creator')
+
+for through in (Resource.subjects.through, Resource.geo_locations.through, Name.affiliations.through,
+                Creator, Contributor, AlternateIdentifier, RelatedIdentifier, FundingReference, RelatedItem):
+    m2m_changed.connect(handle_m2m_changed, sender=through,
+                        dispatch_uid=f'datacite_m2m_changed_{through._meta.model_name}')
+
+
+@receiver(resources_changed, dispatch_uid='datacite_delete_cached')
+def handle_resources_changed(sender, resource_ids, using=None, **kwargs):
+    delete_cached(resource_ids)
+
+    # rendering the snapshots adds to the time of every committed change, with DATACITE_SNAPSHOTS_DEFERRED
+    # the snapshots only become stale, the views do not use them until `datacite_snapshots --stale` runs
+    if get_settings('DATACITE_SNAPSHOTS') and not get_settings('DATACITE_SNAPSHOTS_DEFERRED'):
+        update_snapshots(resource_ids, using)
@@ -0,0 +1,42 @@
+import json
+
+from django.db.models import F, Q
+
+from .exports import export_resource, iter_resources
+from .models import Resource, ResourceSnapshot
+from .renderers import XMLRenderer
+from .utils import get_settings, render_bibtex
+
+
+def update_snapshot(resource, using=None):
+    data = export_resource(resource)
+
+    snapshot, _ = ResourceSnapshot.objects.using(using).update_or_create(resource=resource, defaults={
+        'public': resource.public,
+        'identifier': resource.identifier.identifier if resource.identifier else '',
+        'identifier_type': resource.identifier.identifier_type if resource.identifier else '',
+        'revision': resource.revision,
+        'json': json.dumps(data, indent=2),
+        'xml': XMLRenderer().render(data),
+        'bibtex': render_bibtex(resource),
+        'citation': resource.citation
+    })
+    return snapshot
+
+
+def update_snapshots(resource_ids, using=None):
+    # e.g. a changed name can change many resources, which are loaded in chunks
+    for resource in iter_resources(Resource.objects.using(using).filter(pk__in=resource_ids)):
+        update_snapshot(resource, using)
+
+
+def get_stale_resource_ids(using=None):
+    # the resources without a snapshot or with a snapshot of an older revision
+    return Resource.objects.using(using).filter(
+        Q(snapshot=None) | ~Q(snapshot__revision=F('revision'))
+    ).order_by('pk').values_list('pk', flat=True)
+
+
+def get_snapshot(identifier):
+    if get_settings('DATACITE_SNAPSHOTS'):
+        return ResourceSnapshot.objects.filter(public=True, identifier=identifier).first()
@@ -1,9 +1,14 @@
 import json
 import re
 
+import pytest
+
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from django_datacite.copies import copy_resources
 from django_datacite.models import Resource
 
 resource_id = 1
@@ -127,6 +132,29 @@ def test_resource_export_get_404_format(db, client):
     assert response.status_code == 404
 
 
+def test_resource_changelist(db, client):
+    client.login(username='admin', password='admin')
+
+    url = reverse('admin:datacite_resource_changelist')
+    client.get(url)  # the site is cached with the first request
+
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+
+    # the number of queries does not depend on the number of resources
+    resources = list(Resource.objects.all())
+    while len(resources) < 100:
+        resources += copy_resources(resources)
+
+    with CaptureQueriesContext(connection) as more_context:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert response.content.count(b'Test Dataset') + response.content.count(b'Related item') == 100
+
+    assert len(more_context) == len(context)
+
+
 def test_resource_import_get(db, client):
     client.login(username='admin', password='admin')
 
@@ -181,6 +209,33 @@ def test_resource_import_post_url_invalid(db, client, requests_mock):
     assert response.status_code == 200
 
 
+@pytest.mark.parametrize('content_type,text', [
+    ('application/xml', '<resource'),
+    ('application/xml', '<collection/>'),
+    ('application/json', '[]'),
+])
+def test_resource_import_post_url_no_resource(db, client, requests_mock, content_type, text):
+    client.login(username='admin', password='admin')
+
+    url = reverse('admin:datacite_resource_import')
+    requests_mock.get('https://example.com/datacite', text=text, headers={'Content-Type': content_type})
+
+    response = client.post(url, {'_send': True, 'url': 'https://example.com/datacite'})
+    assert response.status_code == 200
+    assert b'errorlist' in response.content
+
+
+def test_resource_import_post_url_not_found(db, client, requests_mock):
+    client.login(username='admin', password='admin')
+
+    url = reverse('admin:datacite_resource_import')
+    requests_mock.get('https://example.com/datacite.json', status_code=404)
+
+    response = client.post(url, {'_send': True, 'url': 'https://example.com/datacite.json'})
+    assert response.status_code == 200
+    assert b'errorlist' in response.content
+
+
 def test_resource_import_post_file_url(db, client, requests_mock):
     client.login(username='admin', password='admin')
 
@@ -208,6 +263,41 @@ def test_resource_import_post_back(db, client):
     assert response.url == '/admin/datacite/resource/'
 
 
+def test_resource_import_urls_get(db, client):
+    client.login(username='admin', password='admin')
+
+    url = reverse('admin:datacite_resource_import_urls')
+    response = client.get(url)
+    assert response.status_code == 200
+
+
+def test_resource_import_urls_post(db, client, requests_mock):
+    client.login(username='admin', password='admin')
+
+    url = reverse('admin:datacite_resource_import_urls')
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        requests_mock.get('https://example.com/datacite.json', json=json.load(fp))
+    requests_mock.get('https://example.com/missing.json', status_code=404)
+
+    response = client.post(url, {
+        '_send': True,
+        'urls': 'https://example.com/datacite.json\nhttps://example.com/missing.json\n'
+    })
+    assert response.status_code == 200
+    assert b'/admin/datacite/resource/1/change/' in response.content
+    assert b'404 Client Error' in response.content
+
+
+def test_resource_import_urls_post_back(db, client):
+    client.login(username='admin', password='admin')
+
+    url = reverse('admin:datacite_resource_import_urls')
+    response = client.post(url, {'_back': True})
+    assert response.status_code == 302
+    assert response.url == '/admin/datacite/resource/'
+
+
 def test_resource_import_resource_get(db, client):
     client.login(username='admin', password='admin')
 
@@ -288,6 +378,18 @@ def test_resource_create_new_version_post_back(db, client):
     assert Resource.objects.count() == 2
 
 
+def test_resource_create_new_versions_action(db, client):
+    client.login(username='admin', password='admin')
+
+    url = reverse('admin:datacite_resource_changelist')
+    response = client.post(url, {
+        'action': 'create_new_versions',
+        '_selected_action': [resource.id for resource in Resource.objects.all()]
+    })
+    assert response.status_code == 302
+    assert Resource.objects.count() == 4
+
+
 def test_resource_validate_get(db, client):
     client.login(username='admin', password='admin')
 
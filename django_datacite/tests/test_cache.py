@@ -0,0 +1,73 @@
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django_datacite.cache import (
+    delete_cached,
+    get_cache,
+    get_cache_key,
+    render_resource_bibtex,
+    render_resource_json,
+    render_resource_xml,
+)
+from django_datacite.models import Resource
+
+resource_id = 1
+
+render_funcs = [render_resource_json, render_resource_xml, render_resource_bibtex]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(settings):
+    # the cache is only used if DATACITE_CACHE is set
+    settings.DATACITE_CACHE = 'default'
+    get_cache().clear()
+
+
+@pytest.mark.parametrize('render_func', render_funcs)
+def test_render_cached(db, django_assert_num_queries, render_func):
+    resource = Resource.objects.get(id=resource_id)
+    value = render_func(resource)
+
+    with django_assert_num_queries(0):
+        assert render_func(resource) == value
+
+
+@pytest.mark.parametrize('render_func', render_funcs)
+def test_render_invalidated(db, django_capture_on_commit_callbacks, render_func):
+    resource = Resource.objects.get(id=resource_id)
+    render_func(resource)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        title = resource.titles.get(title_type='')
+        title.title = 'Changed title'
+        title.save()
+
+    assert get_cache().get(get_cache_key(resource_id, 'json')) is None
+
+    resource = Resource.objects.get(id=resource_id)
+    assert 'Changed title' in render_func(resource)
+
+
+def test_render_revision(db):
+    resource = Resource.objects.get(id=resource_id)
+    render_resource_json(resource)
+
+    # a value stored for another revision is not used
+    get_cache().set(get_cache_key(resource_id, 'json'), (resource.revision - 1, 'stale'))
+    assert render_resource_json(resource) != 'stale'
+
+
+def test_render_not_cached(db, settings):
+    settings.DATACITE_CACHE = None
+    assert get_cache() is None
+
+    value = render_resource_json(Resource.objects.get(id=resource_id))
+    delete_cached([resource_id])
+
+    # the resource is rendered again
+    resource = Resource.objects.get(id=resource_id)
+    with CaptureQueriesContext(connection) as context:
+        assert render_resource_json(resource) == value
+    assert len(context) > 0
@@ -0,0 +1,41 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django_datacite.exports import export_resource, export_resources
+from django_datacite.models import Resource
+
+resource_id = 1
+
+
+def test_export(db):
+    resource = Resource.objects.get(id=resource_id)
+    data = export_resource(resource)
+
+    assert data['identifiers'] == [{'identifier': '10.12345/12345', 'identifierType': 'DOI'}]
+
+
+def test_export_for_export(db, django_assert_num_queries):
+    data = export_resource(Resource.objects.get(id=resource_id))
+
+    resource = Resource.objects.for_export().get(id=resource_id)
+    with django_assert_num_queries(0):
+        assert export_resource(resource) == data
+
+
+def test_export_resources(db):
+    queryset = Resource.objects.all()
+    data = [export_resource(resource) for resource in queryset.order_by('pk')]
+
+    assert list(export_resources(queryset)) == data
+    assert list(export_resources(queryset, chunk_size=1)) == data
+
+
+def test_export_resources_queries(db):
+    # the number of queries per chunk does not depend on the number of resources
+    with CaptureQueriesContext(connection) as single_context:
+        list(export_resources(Resource.objects.filter(id=resource_id)))
+
+    with CaptureQueriesContext(connection) as all_context:
+        list(export_resources(Resource.objects.all()))
+
+    assert len(single_context) == len(all_context)
@@ -1,13 +1,72 @@
+import io
 import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
 
 from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 
-from django_datacite.imports import import_resource
-from django_datacite.models import Identifier, Name, Resource, Subject
+from django_datacite import imports
+from django_datacite.exports import export_resource
+from django_datacite.imports import ImportSession, import_identifier, import_name, import_resource, import_urls
+from django_datacite.models import Identifier, Name, NameIdentifier, Resource, Subject
+from django_datacite.renderers import XMLRenderer
 
 resource_id = 1
 
 
+@pytest.fixture
+def http_server():
+    # a local stand-in for the upstream servers, 503.json fails once before it succeeds
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        data = json.load(fp)
+
+    responses = {
+        '/resource.json': ('application/json', json.dumps(data)),
+        '/resource.xml': ('application/xml', XMLRenderer().render(data)),
+        '/doi/10.12345/12345': ('application/vnd.datacite.datacite+json', json.dumps(data)),
+        '/503.json': ('application/json', json.dumps(data)),
+        '/invalid.xml': ('application/xml', '<resource'),
+        '/empty.xml': ('application/xml', '<collection/>')
+    }
+    requests = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            requests[self.path] += 1
+            if self.path not in responses:
+                self.send_error(404)
+            elif self.path == '/503.json' and requests[self.path] == 1:
+                self.send_error(503)
+            else:
+                content_type, body = responses[self.path]
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body.encode())))
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = requests
+    server.url = 'http://{}:{}'.format(*server.server_address)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
 def test_import(db):
     file_path = settings.BASE_PATH / 'json' / 'resource.json'
     with open(file_path, encoding='utf8') as fp:
@@ -38,3 +97,448 @@ def test_import_resource(db):
 
     resource = Resource.objects.get(id=resource_id)
     resource = import_resource(resource, file_data)
+
+
+def test_import_identifier_citation(db):
+    with CaptureQueriesContext(connection) as context:
+        identifier = import_identifier({
+            'identifier': '10.12345/new',
+            'identifierType': 'DOI',
+            'citation': 'A citation'
+        })
+
+    # the citation is inserted with the identifier
+    assert Identifier.objects.get(id=identifier.id).citation == 'A citation'
+    assert not [query for query in context if query['sql'].startswith('UPDATE')]
+
+
+@pytest.mark.parametrize('resource_id', [None, resource_id])
+def test_import_resource_bulk(db, resource_id):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    def import_and_export(bulk):
+        with transaction.atomic():
+            resource = Resource.objects.get(id=resource_id) if resource_id else Resource()
+            with CaptureQueriesContext(connection) as context:
+                resource = import_resource(resource, file_data, bulk=bulk)
+            data = export_resource(Resource.objects.for_export().get(id=resource.id))
+            transaction.set_rollback(True)
+        return data, len(context)
+
+    data, queries = import_and_export(bulk=False)
+    bulk_data, bulk_queries = import_and_export(bulk=True)
+
+    assert bulk_data == data
+    assert bulk_queries < queries
+
+    def count_session_queries(data):
+        with transaction.atomic():
+            resource = Resource.objects.get(id=resource_id) if resource_id else Resource()
+            session = ImportSession()
+            session.prefetch([data])
+            with CaptureQueriesContext(connection) as context:
+                session.import_resource(resource, data, bulk=True)
+            transaction.set_rollback(True)
+        return len(context)
+
+    def add_rows(count):
+        more_data = json.loads(json.dumps(file_data))
+        for key, field_name in [('titles', 'title'), ('descriptions', 'description'), ('rightsList', 'rights')]:
+            more_data[key] += [dict(node, **{field_name: f'Another {field_name} {index}'})
+                               for index in range(count) for node in file_data[key]]
+        return more_data
+
+    # with the shared entities in the session, the number of queries of a record
+    # does not depend on the number of its rows, but only on the number of models
+    assert count_session_queries(add_rows(10)) == count_session_queries(add_rows(1))
+
+
+def test_import_resource_session(db):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    resource = import_resource(Resource(), file_data)
+    data = export_resource(Resource.objects.for_export().get(id=resource.id))
+
+    with CaptureQueriesContext(connection) as context:
+        import_resource(resource, file_data)
+
+    session = ImportSession()
+    session.import_resource(resource, file_data)
+    with CaptureQueriesContext(connection) as session_context:
+        session.import_resource(resource, file_data)
+
+    # the shared entities are not looked up again
+    assert not any('"datacite_nameidentifier"' in query['sql'] for query in session_context)
+    assert not any('WHERE "datacite_subject"' in query['sql'] for query in session_context)
+    assert len(session_context) < len(context)
+    assert export_resource(Resource.objects.for_export().get(id=resource.id)) == data
+
+
+def test_import_resource_session_related_items(db, monkeypatch):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    other_data = json.loads(json.dumps(file_data))
+    other_data['identifiers'] = [{'identifier': '10.12345/other', 'identifierType': 'DOI'}]
+
+    session = ImportSession()
+    session.import_resource(Resource(), file_data)
+
+    item_identifiers = []
+    original_import_resource = imports.import_resource
+
+    def import_resource_spy(resource_instance, data, *args, **kwargs):
+        if 'schemaVersion' not in data:
+            item_identifiers.append(data['identifiers'][0]['identifier'])
+        return original_import_resource(resource_instance, data, *args, **kwargs)
+
+    monkeypatch.setattr(imports, 'import_resource', import_resource_spy)
+
+    # the related items were already imported for the first record and are not imported again
+    other_resource = session.import_resource(Resource(), other_data)
+    assert item_identifiers == []
+    assert other_resource.relateditem_set.count() == len(file_data['relatedItems'])
+
+    # unless their data has changed
+    other_data['relatedItems'][0]['publisher'] = 'Another publisher'
+    session.import_resource(other_resource, other_data)
+    assert item_identifiers == [other_data['relatedItems'][0]['relatedItemIdentifier']]
+
+
+def test_import_resource_prefetch(db):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    resource = import_resource(Resource(), file_data)
+    data = export_resource(Resource.objects.for_export().get(id=resource.id))
+
+    session = ImportSession()
+    session.prefetch([file_data])
+    with CaptureQueriesContext(connection) as context:
+        session.import_resource(Resource.objects.get(id=resource.id), file_data, bulk=True)
+
+    # the identifiers, names, subjects and geo locations are not looked up one by one
+    tables = ('datacite_identifier', 'datacite_nameidentifier', 'datacite_name', 'datacite_name_affiliations')
+    assert not [query for query in context if query['sql'].startswith(tuple(f'SELECT "{table}".' for table in tables))]
+    assert not [query for query in context if 'WHERE "datacite_subject"' in query['sql']]
+    assert not [query for query in context if 'WHERE "datacite_geolocation' in query['sql']]
+    assert export_resource(Resource.objects.for_export().get(id=resource.id)) == data
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_import_resource_events(db, caplog, bulk):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    resource = Resource.objects.get(id=resource_id)
+
+    with CaptureQueriesContext(connection) as context:
+        with transaction.atomic():
+            ImportSession().import_resource(resource, file_data, bulk=bulk)
+            transaction.set_rollback(True)
+
+    events, records = [], []
+    session = ImportSession(on_event=events.append, on_record=lambda *args: records.append(args))
+
+    # the verbose logging does not trigger extra queries
+    with caplog.at_level('INFO', logger='django_datacite.imports'):
+        with CaptureQueriesContext(connection) as logging_context:
+            with transaction.atomic():
+                session.import_resource(resource, file_data, bulk=bulk)
+                transaction.set_rollback(True)
+
+    assert len(logging_context) == len(context)
+    assert caplog.records
+
+    # the events of the related items are part of the record
+    assert len(records) == 1
+    assert records[0][0] == resource
+    assert records[0][1] == session.events
+    assert sum(session.events.values()) == len(events)
+    assert events[-1] == ('Resource', resource.pk, 'updated')
+    assert ('Title', 'unchanged') in session.events
+    assert all(event.pk is not None for event in events)
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_datacite_import_ndjson(db, tmp_path, bulk):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    ndjson_path = tmp_path / 'resources.ndjson'
+    ndjson_path.write_text('\n'.join([
+        json.dumps(file_data),
+        '{invalid',
+        json.dumps(dict(file_data, identifiers=[{'identifier': '10.12345/67890', 'identifierType': 'DOI'}]))
+    ]))
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command('datacite_import', str(ndjson_path), chunk_size=2, bulk=bulk, verbosity=2,
+                 stdout=stdout, stderr=stderr)
+
+    assert stdout.getvalue().startswith('2 records imported, 1 failed')
+    assert 'Resources: 1 created, 1 updated, 0 unchanged.' in stdout.getvalue()
+    assert 'Related items: 0 created, 0 updated, 2 unchanged.' in stdout.getvalue()
+    assert 'Resource: 1 created, 2 unchanged, 1 updated.' in stdout.getvalue()
+    assert f'{ndjson_path}:2' in stderr.getvalue()
+    assert Resource.objects.filter(identifier__identifier='10.12345/12345').count() == 1
+    assert Resource.objects.filter(identifier__identifier='10.12345/67890').count() == 1
+
+
+def test_datacite_import_directory(db, tmp_path):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'resource.json').write_text(file_path.read_text(encoding='utf8'))
+
+    stdout = io.StringIO()
+    call_command('datacite_import', str(tmp_path), bulk=True, stdout=stdout)
+
+    assert stdout.getvalue().startswith('1 records imported, 0 failed')
+    assert Resource.objects.filter(identifier__identifier='10.12345/12345').count() == 1
+
+
+def test_datacite_import_stdin(db, monkeypatch):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    monkeypatch.setattr('sys.stdin', io.StringIO(json.dumps(file_data) + '\n'))
+
+    stdout = io.StringIO()
+    call_command('datacite_import', stdout=stdout)
+
+    assert stdout.getvalue().startswith('1 records imported, 0 failed')
+
+
+def test_import_name_concurrent(db, monkeypatch):
+    name_identifier = NameIdentifier.objects.select_related('name').first()
+    name_count = Name.objects.count()
+
+    # simulate that the name identifier was created by another process after the lookup
+    def get(**kwargs):
+        raise NameIdentifier.DoesNotExist
+    monkeypatch.setattr(NameIdentifier.objects, 'get', get)
+
+    name_instance = import_name({
+        'name': 'Concurrent Name',
+        'nameType': 'Personal',
+        'nameIdentifiers': [{
+            'nameIdentifier': name_identifier.name_identifier,
+            'nameIdentifierScheme': name_identifier.name_identifier_scheme
+        }]
+    })
+
+    assert name_instance == name_identifier.name
+    assert Name.objects.count() == name_count
+    assert NameIdentifier.objects.filter(name_identifier=name_identifier.name_identifier).count() == 1
+
+
+def test_import_name_concurrent_second_identifier(db, monkeypatch):
+    name_identifier = NameIdentifier.objects.select_related('name').first()
+    name_count = Name.objects.count()
+
+    # simulate that the second name identifier was created by another process after the lookup
+    def get(**kwargs):
+        raise NameIdentifier.DoesNotExist
+    monkeypatch.setattr(NameIdentifier.objects, 'get', get)
+
+    session = ImportSession()
+    name_instance = import_name({
+        'name': 'Concurrent Name',
+        'nameType': 'Personal',
+        'nameIdentifiers': [{
+            'nameIdentifier': '0000-0000-0000-0001',
+            'nameIdentifierScheme': 'ORCID'
+        }, {
+            'nameIdentifier': name_identifier.name_identifier,
+            'nameIdentifierScheme': name_identifier.name_identifier_scheme
+        }]
+    }, session)
+
+    # the first name identifier was created for the deleted name and is moved to the existing name
+    new_name_identifier = NameIdentifier.objects.filter(name_identifier='0000-0000-0000-0001').get()
+    assert name_instance == name_identifier.name
+    assert new_name_identifier.name == name_identifier.name
+    assert Name.objects.count() == name_count
+
+    cached_name_identifier = session.name_identifiers[('0000-0000-0000-0001', 'ORCID')]
+    assert cached_name_identifier.pk == new_name_identifier.pk
+    assert cached_name_identifier.name == name_identifier.name
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_import_resource_unchanged(db, bulk):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    resource = import_resource(Resource(), file_data)
+    revision = Resource.objects.get(id=resource.id).revision
+
+    session = ImportSession()
+    with CaptureQueriesContext(connection) as context:
+        session.import_resource(Resource.objects.get(id=resource.id), file_data, bulk=bulk)
+
+    assert not [query for query in context if not query['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+    assert session.counts['unchanged'] > 0
+    assert not session.counts['created']
+    assert not session.counts['updated']
+    assert Resource.objects.get(id=resource.id).revision == revision
+
+
+def test_import_resource_updated(db, django_capture_on_commit_callbacks):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resource = import_resource(Resource(), file_data)
+
+    file_data['titles'][0]['title'] = 'A changed title'
+
+    # the citation is updated when the transaction is committed
+    session = ImportSession()
+    with django_capture_on_commit_callbacks(execute=True):
+        session.import_resource(Resource.objects.get(id=resource.id), file_data)
+
+    assert session.counts['updated'] == 1
+    assert 'A changed title' in Resource.objects.get(id=resource.id).identifier.citation
+
+
+def test_import_resource_dry_run(db):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    file_data['identifiers'] = [{'identifier': '10.12345/67890', 'identifierType': 'DOI'}]
+
+    session = ImportSession(dry_run=True)
+    with CaptureQueriesContext(connection) as context:
+        session.import_resource(Resource(), file_data)
+
+    assert all(query['sql'].startswith('SELECT') for query in context)
+    assert not Identifier.objects.filter(identifier='10.12345/67890').exists()
+
+    diff = session.diffs[-1]
+    assert diff['action'] == 'created'
+    assert diff['fields']['identifier'] == [None, '(DOI) https://doi.org/10.12345/67890']
+    assert len(diff['relations']['Title']['created']) == len(file_data['titles'])
+    assert len(diff['relations']['Creator']['created']) == len(file_data['creators'])
+
+    # the diffs of the related items are marked and not counted as records
+    assert [diff['related_item'] for diff in session.diffs] == [True] * len(file_data['relatedItems']) + [False]
+    assert session.counts == Counter(created=1)
+    assert sum(session.related_counts.values()) == len(file_data['relatedItems'])
+
+
+def test_import_resource_dry_run_changed(db):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    resource = import_resource(Resource(), file_data)
+
+    session = ImportSession(dry_run=True)
+    session.import_resource(Resource.objects.get(id=resource.id), file_data)
+    assert session.diffs[-1]['action'] == 'unchanged'
+
+    title = file_data['titles'][0]['title']
+    file_data['titles'][0]['title'] = 'A changed title'
+    file_data['version'] = '2.0.0'
+
+    session = ImportSession(dry_run=True)
+    session.import_resource(Resource.objects.get(id=resource.id), file_data)
+
+    diff = session.diffs[-1]
+    assert diff['action'] == 'updated'
+    assert diff['fields'] == {'version': [resource.version, '2.0.0']}
+    assert diff['relations']['Title']['updated'] == [{'title': [title, 'A changed title']}]
+    assert Resource.objects.get(id=resource.id).title == title
+
+
+def test_datacite_import_dry_run(db, tmp_path):
+    file_path = settings.BASE_PATH / 'json' / 'resource.json'
+    with open(file_path, encoding='utf8') as fp:
+        file_data = json.load(fp)
+
+    ndjson_path = tmp_path / 'resources.ndjson'
+    ndjson_path.write_text(json.dumps(dict(file_data, version='3.0.0')))
+
+    stdout = io.StringIO()
+    call_command('datacite_import', str(ndjson_path), dry_run=True, stdout=stdout)
+
+    diff = json.loads(stdout.getvalue().splitlines()[0])
+    assert diff['action'] == 'updated'
+    assert diff['related_item'] is False
+    assert diff['fields']['version'][1] == '3.0.0'
+    assert Resource.objects.get(id=resource_id).version != '3.0.0'
+
+
+def test_datacite_import_xml(db, tmp_path):
+    data = [export_resource(resource) for resource in Resource.objects.order_by('pk')]
+
+    xml_path = tmp_path / 'resources.xml'
+    xml_path.write_text(XMLRenderer().render_collection(data))
+
+    stdout = io.StringIO()
+    call_command('datacite_import', str(xml_path), stdout=stdout)
+
+    assert stdout.getvalue().startswith(f'{len(data)} records imported, 0 failed')
+
+
+def test_datacite_import_xml_invalid_record(db, tmp_path):
+    records = [
+        f'''<resource xmlns="http://datacite.org/schema/kernel-4">
+    <identifier identifierType="DOI">10.12345/xml-{number}</identifier>
+    <geoLocations><geoLocation><geoLocationPoint>
+        <pointLongitude>{longitude}</pointLongitude><pointLatitude>1</pointLatitude>
+    </geoLocationPoint></geoLocation></geoLocations>
+</resource>''' for number, longitude in [(1, '1'), (2, ''), (3, '3')]
+    ]
+    xml_path = tmp_path / 'resources.xml'
+    xml_path.write_text('<collection>{}</collection>'.format(''.join(records)))
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command('datacite_import', str(xml_path), stdout=stdout, stderr=stderr)
+
+    # the invalid record is skipped
+    assert stdout.getvalue().startswith('2 records imported, 1 failed')
+    assert f'{xml_path}:2' in stderr.getvalue()
+    assert Resource.objects.filter(identifier__identifier__startswith='10.12345/xml-').count() == 2
+
+
+def test_import_urls(db, settings, http_server):
+    settings.DOI_BASE_URL = f'{http_server.url}/doi/'
+    settings.DATACITE_IMPORT_BACKOFF = 0
+
+    urls = [
+        f'{http_server.url}/resource.json',
+        f'{http_server.url}/resource.xml',
+        f'{http_server.url}/503.json',
+        f'{http_server.url}/404.json',
+        f'{http_server.url}/invalid.xml',
+        f'{http_server.url}/empty.xml',
+        '10.12345/12345'
+    ]
+    results = import_urls(urls, max_workers=4)
+
+    # the failed urls do not abort the other imports
+    assert [url for url, result in results] == urls
+    for url, result in results:
+        if url.endswith(('404.json', 'invalid.xml')):
+            assert isinstance(result, Exception)
+        elif url.endswith('empty.xml'):
+            assert str(result) == 'document does not contain a DataCite resource'
+        else:
+            assert result.identifier.identifier == '10.12345/12345'
+
+    assert http_server.requests['/503.json'] == 2
+    assert Resource.objects.filter(identifier__identifier='10.12345/12345').count() == 1
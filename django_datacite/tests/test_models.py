@@ -1,11 +1,34 @@
+import io
+
 import pytest
 
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
 from django.http import Http404
+from django.test.utils import CaptureQueriesContext
+from django.utils.connection import ConnectionDoesNotExist
 
-from django_datacite.models import GeoLocation, NameIdentifier, Resource
+from django_datacite.copies import create_new_versions
+from django_datacite.exports import export_resource
+from django_datacite.models import (
+    Creator,
+    GeoLocation,
+    GeoLocationPolygon,
+    Identifier,
+    Name,
+    NameIdentifier,
+    RelatedIdentifier,
+    Resource,
+    Subject,
+)
+from django_datacite.signals import get_batch, get_resource_ids
 
 resource_id = 1
+related_item_resource_id = 2
+name_id = 1
 name_identifier_id = 1
+subject_id = 1
 geo_location_ids = [1, 2, 3]
 
 
@@ -32,3 +55,362 @@ def test_name_identifier_url(db):
 def test_geo_location_str(db, geo_location_id):
     geo_location = GeoLocation.objects.get(id=geo_location_id)
     assert str(geo_location)
+
+
+def test_resource_revision_title(db, django_capture_on_commit_callbacks):
+    resource = Resource.objects.get(id=resource_id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resource.titles.create(title='Another title', title_type='AlternativeTitle')
+        resource.titles.create(title='Yet another title', title_type='Subtitle')
+
+    # the changes are coalesced per transaction
+    resource_after = Resource.objects.get(id=resource_id)
+    assert resource_after.revision == resource.revision + 1
+    assert resource_after.modified_at > resource.modified_at
+
+
+def test_resource_revision_save(db, django_capture_on_commit_callbacks):
+    resource = Resource.objects.get(id=resource_id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resource.public = False
+        resource.save()
+
+    # a stale instance does not overwrite the revision
+    with django_capture_on_commit_callbacks(execute=True):
+        resource.save()
+
+    assert Resource.objects.get(id=resource_id).revision == resource.revision + 2
+
+
+def test_resource_revision_savepoints(db, django_capture_on_commit_callbacks):
+    resource = Resource.objects.get(id=resource_id)
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        # the batch of the rolled back savepoint is discarded, a new one is used afterwards
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                resource.titles.create(title='Rolled back title', title_type='Subtitle')
+                raise ValueError
+
+        with transaction.atomic():
+            resource.titles.create(title='Another title', title_type='AlternativeTitle')
+
+        with transaction.atomic():
+            resource.titles.create(title='Yet another title', title_type='Subtitle')
+
+    assert len(callbacks) == 1
+    assert Resource.objects.get(id=resource_id).revision == resource.revision + 1
+    assert not resource.titles.filter(title='Rolled back title').exists()
+
+    # the next transaction uses a new batch
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        resource.titles.create(title='A third title', title_type='Subtitle')
+
+    assert len(callbacks) == 1
+    assert Resource.objects.get(id=resource_id).revision == resource.revision + 2
+
+
+def test_resource_change_batch_pending(db):
+    # relies on the on_commit callbacks of the connection, which are not a public api of django
+    with transaction.atomic():
+        batch = get_batch()
+        assert batch.is_pending()
+        assert get_batch() is batch
+
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                savepoint_batch = get_batch()
+                assert savepoint_batch is batch
+                raise ValueError
+
+        # the callback was registered outside of the rolled back savepoint
+        assert batch.is_pending()
+
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                batch.flushed = True
+                savepoint_batch = get_batch()
+                assert savepoint_batch is not batch
+                assert savepoint_batch.is_pending()
+                raise ValueError
+
+        # the callback of the rolled back savepoint was discarded by django
+        assert not savepoint_batch.is_pending()
+        assert get_batch() is not savepoint_batch
+
+
+@pytest.mark.parametrize('model,pk', [
+    (Identifier, 1), (Name, name_id), (NameIdentifier, name_identifier_id), (Subject, subject_id),
+    (GeoLocation, geo_location_ids[0]), (GeoLocationPolygon, None)
+])
+def test_get_resource_ids_using(db, model, pk):
+    # the resources are looked up in the database of the signal
+    instance = model.objects.get(pk=pk) if pk else model.objects.first()
+    assert list(get_resource_ids(instance, 'default'))
+
+    with pytest.raises(ConnectionDoesNotExist):
+        list(get_resource_ids(instance, 'other'))
+
+
+def test_resource_revision_created_entities(db, django_capture_on_commit_callbacks):
+    revision = Resource.objects.get(id=resource_id).revision
+
+    # new shared entities are not used by any resource yet, the resources are not looked up
+    with CaptureQueriesContext(connection) as context:
+        Identifier.objects.create(identifier='10.12345/new', identifier_type='DOI')
+        name = Name.objects.create(name='New Name', name_type='Personal')
+        Subject.objects.create(subject='New subject')
+        GeoLocation.objects.create(geo_location_place='New place')
+
+    assert not [query for query in context if '"datacite_resource"' in query['sql']]
+
+    # but a new name identifier changes the resources of an existing name
+    with django_capture_on_commit_callbacks(execute=True):
+        NameIdentifier.objects.create(name_id=name_id, name_identifier='0000-0000-0000-0002',
+                                      name_identifier_scheme='ORCID')
+        NameIdentifier.objects.create(name=name, name_identifier='0000-0000-0000-0003',
+                                      name_identifier_scheme='ORCID')
+
+    assert Resource.objects.get(id=resource_id).revision == revision + 1
+
+
+def test_resource_revision_name(db, django_capture_on_commit_callbacks):
+    revision = Resource.objects.get(id=resource_id).revision
+
+    with django_capture_on_commit_callbacks(execute=True):
+        name = Name.objects.get(id=name_id)
+        name.given_name = 'Changed'
+        name.save()
+
+    assert Resource.objects.get(id=resource_id).revision == revision + 1
+
+
+def test_resource_revision_subjects(db, django_capture_on_commit_callbacks):
+    revision = Resource.objects.get(id=resource_id).revision
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Subject.objects.get(id=subject_id).resources.clear()
+
+    assert Resource.objects.get(id=resource_id).revision == revision + 1
+
+
+def test_resource_revision_geo_location_polygon(db, django_capture_on_commit_callbacks):
+    revision = Resource.objects.get(id=resource_id).revision
+
+    with django_capture_on_commit_callbacks(execute=True):
+        GeoLocationPolygon.objects.first().delete()
+
+    assert Resource.objects.get(id=resource_id).revision == revision + 1
+
+
+def test_resource_revision_related_item(db, django_capture_on_commit_callbacks):
+    revision = Resource.objects.get(id=resource_id).revision
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Resource.objects.get(id=related_item_resource_id).titles.update_or_create(
+            title_type='', defaults={'title': 'Changed'}
+        )
+
+    # the resource uses the changed resource as related item
+    assert Resource.objects.get(id=resource_id).revision == revision + 1
+
+
+def test_resource_title(db, django_assert_num_queries):
+    resource = Resource.objects.with_title().get(id=resource_id)
+    with django_assert_num_queries(0):
+        assert resource.title == 'Test Dataset'
+
+    resource = Resource.objects.prefetch_related('titles').get(id=resource_id)
+    with django_assert_num_queries(0):
+        assert resource.title == 'Test Dataset'
+
+    resource = Resource.objects.get(id=resource_id)
+    with django_assert_num_queries(1):
+        assert resource.title == 'Test Dataset'
+
+
+def test_resource_citation_save(db, django_capture_on_commit_callbacks):
+    resource = Resource.objects.get(id=resource_id)
+
+    # the citation is not rendered if no field of the citation has changed
+    with CaptureQueriesContext(connection) as context:
+        with django_capture_on_commit_callbacks(execute=True):
+            resource.public = not resource.public
+            resource.save()
+
+    assert not any('"datacite_title"' in query['sql'] for query in context)
+    assert not any(query['sql'].startswith('UPDATE "datacite_identifier"') for query in context)
+
+    # the citation is rendered once, after the related rows are saved
+    with CaptureQueriesContext(connection) as context:
+        with django_capture_on_commit_callbacks(execute=True):
+            resource.version = '2.0'
+            resource.save()
+            title = resource.titles.get(title_type='')
+            title.title = 'Changed'
+            title.save()
+
+    assert len([query for query in context if query['sql'].startswith('UPDATE "datacite_identifier"')]) == 1
+    assert Resource.objects.get(id=resource_id).identifier.citation == \
+        'Test, Tanja; Test, Tom; Test, Thomas (2023): Changed. Version 2.0. Test Repository. (Dataset). ' \
+        'https://doi.org/10.12345/12345.'
+
+
+def test_resource_citation_name(db, settings, django_capture_on_commit_callbacks):
+    settings.DATACITE_CITATION_CHUNK_SIZE = 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        name = Name.objects.get(id=name_id + 2)
+        name.family_name = 'Tester'
+        name.save()
+
+    # the name is a creator of both resources
+    for resource in Resource.objects.all():
+        assert 'Tester, Tanja' in resource.identifier.citation
+
+    # names which are not used in citations, e.g. affiliations, do not change them
+    with CaptureQueriesContext(connection) as context:
+        with django_capture_on_commit_callbacks(execute=True):
+            name = Name.objects.get(id=name_id)
+            name.name = 'Institute of Applied Tests'
+            name.save()
+
+    assert not any(query['sql'].startswith('UPDATE "datacite_identifier"') for query in context)
+
+
+def test_resource_citation_identifier(db, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        identifier = Identifier.objects.get(id=resource_id)
+        identifier.identifier = '10.12345/54321'
+        identifier.save()
+
+    assert Identifier.objects.get(id=resource_id).citation.endswith('https://doi.org/10.12345/54321.')
+
+
+def test_resource_citation_title(db, django_capture_on_commit_callbacks):
+    resource = Resource.objects.get(id=resource_id)
+
+    # only the main title is used in the citation
+    with CaptureQueriesContext(connection) as context:
+        with django_capture_on_commit_callbacks(execute=True):
+            resource.titles.create(title='Subtitle', title_type='Subtitle')
+
+    assert not any('"datacite_creator"' in query['sql'] for query in context)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        title = resource.titles.get(title_type='')
+        title.title_type = 'AlternativeTitle'
+        title.save()
+
+    assert 'Test Dataset' not in Identifier.objects.get(id=resource_id).citation
+
+
+def test_resource_copy(db):
+    resource = Resource.objects.get(id=resource_id)
+
+    with CaptureQueriesContext(connection) as context:
+        resource_copy = resource.copy()
+
+    data = export_resource(Resource.objects.for_export().get(id=resource_id))
+    copy_data = export_resource(Resource.objects.for_export().get(id=resource_copy.id))
+    data.pop('identifiers')
+    assert copy_data == data
+
+    # the number of queries does not depend on the number of related rows
+    Creator.objects.bulk_create([
+        Creator(resource=resource, name=name, order=order)
+        for order, name in enumerate(Name.objects.all(), 100)
+    ])
+    with CaptureQueriesContext(connection) as more_context:
+        resource.copy()
+
+    assert len(more_context) == len(context)
+
+
+def test_resource_copy_without_returned_pks(db, monkeypatch):
+    # databases, which do not return the primary keys from bulk inserts, save the copies one by one
+    monkeypatch.setattr(type(connection.features), 'can_return_rows_from_bulk_insert', False)
+
+    resource_copy = Resource.objects.get(id=resource_id).copy()
+
+    data = export_resource(Resource.objects.for_export().get(id=resource_id))
+    copy_data = export_resource(Resource.objects.for_export().get(id=resource_copy.id))
+    data.pop('identifiers')
+    assert copy_data == data
+
+
+def test_resource_create_new_version(db, django_capture_on_commit_callbacks):
+    resource = Resource.objects.get(id=resource_id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resource_copy = resource.create_new_version()
+
+    resource_copy = Resource.objects.get(id=resource_copy.id)
+    assert resource_copy.identifier.identifier == '10.12345/12345.1'
+    assert resource_copy.identifier.citation == resource_copy.citation
+    assert resource_copy.revision == 1
+    assert resource_copy.relatedidentifier_set.get(relation_type='IsNewVersionOf').identifier == resource.identifier
+    assert resource.relatedidentifier_set.get(relation_type='IsPreviousVersionOf').identifier == \
+        resource_copy.identifier
+    assert Resource.objects.get(id=resource_id).revision == resource.revision + 1
+
+
+def test_create_new_versions(db, django_capture_on_commit_callbacks):
+    resource, item_resource = Resource.objects.order_by('pk')
+
+    with CaptureQueriesContext(connection) as single_context:
+        with django_capture_on_commit_callbacks(execute=True):
+            resource_copy, = create_new_versions([resource])
+
+    with CaptureQueriesContext(connection) as context:
+        with django_capture_on_commit_callbacks(execute=True):
+            resource_copies = create_new_versions([resource_copy, item_resource])
+
+    assert [resource_copy.identifier.identifier for resource_copy in resource_copies] == \
+        ['10.12345/12345.2', '10.12345/99999.1']
+    assert [resource_copy.version for resource_copy in resource_copies] == ['1.2', '']
+    assert RelatedIdentifier.objects.filter(relation_type='IsPreviousVersionOf').count() == 3
+
+    # the number of queries does not depend on the number of resources, apart from
+    # the deletion of the copied IsNewVersionOf identifier and, on databases which do
+    # not return the primary keys from bulk inserts, the identifier and resource rows
+    per_resource = 0 if connection.features.can_return_rows_from_bulk_insert else 2
+    assert len(context) <= len(single_context) + 1 + per_resource
+
+
+def test_create_new_versions_without_returned_pks(db, monkeypatch):
+    # databases, which do not return the primary keys from bulk inserts, save the identifiers one by one
+    monkeypatch.setattr(type(connection.features), 'can_return_rows_from_bulk_insert', False)
+
+    resources = list(Resource.objects.order_by('pk'))
+    resource_copies = create_new_versions(resources)
+
+    for resource, resource_copy in zip(resources, resource_copies):
+        resource_copy = Resource.objects.get(id=resource_copy.id)
+        assert resource_copy.identifier.identifier == resource.identifier.identifier + '.1'
+        assert resource_copy.relatedidentifier_set.get(relation_type='IsNewVersionOf').identifier == \
+            resource.identifier
+        assert resource.relatedidentifier_set.get(relation_type='IsPreviousVersionOf').identifier == \
+            resource_copy.identifier
+
+
+def test_create_new_versions_collision(db):
+    resources = list(Resource.objects.order_by('pk'))
+    Identifier.objects.create(identifier='10.12345/99999.1', identifier_type='DOI')
+
+    with pytest.raises(ValidationError, match=r'10\.12345/99999\.1'):
+        create_new_versions(resources)
+
+    assert Resource.objects.count() == len(resources)
+
+
+def test_datacite_create_new_versions(db):
+    stdout = io.StringIO()
+    call_command('datacite_create_new_versions', '10.12345/12345', stdout=stdout)
+
+    assert stdout.getvalue() == '10.12345/12345 -> 10.12345/12345.1\n1 new versions created.\n'
+
+    with pytest.raises(CommandError):
+        call_command('datacite_create_new_versions', '10.12345/12345', '10.12345/00000')
@@ -0,0 +1,119 @@
+import io
+
+import pytest
+
+from django_datacite.exports import export_resource
+from django_datacite.imports import import_resource
+from django_datacite.models import Resource
+from django_datacite.parsers import XMLParser
+from django_datacite.renderers import XMLRenderer
+
+resource_ids = [1, 2]
+
+
+def get_expected_data(data):
+    # related items are not rendered, and the resourceTypeGeneral only together with the resourceType
+    data.pop('relatedItems', None)
+    if 'resourceType' not in data.get('types', {}):
+        data.pop('types', None)
+    return data
+
+
+@pytest.mark.parametrize('resource_id', resource_ids)
+def test_parse(db, resource_id):
+    data = export_resource(Resource.objects.get(id=resource_id))
+    xml = XMLRenderer().render(data)
+
+    assert XMLParser().parse(io.StringIO(xml)) == get_expected_data(data)
+
+
+def test_iter_parse_collection(db):
+    data = [export_resource(resource) for resource in Resource.objects.filter(id__in=resource_ids)]
+    xml = XMLRenderer().render_collection(data)
+
+    assert list(XMLParser().iter_parse(io.StringIO(xml))) == [get_expected_data(item) for item in data]
+
+
+def test_iter_parse_envelope():
+    xml = '''<?xml version="1.0" ?>
+<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">
+    <ListRecords>
+        <record>
+            <metadata>
+                <resource xmlns="http://datacite.org/schema/kernel-4">
+                    <identifier identifierType="DOI">10.12345/1</identifier>
+                    <relatedItems>
+                        <relatedItem relatedItemType="Journal" relationType="IsPublishedIn">
+                            <relatedItemIdentifier relatedItemIdentifierType="ISSN">1234-5678</relatedItemIdentifier>
+                            <number numberType="Article">42</number>
+                        </relatedItem>
+                    </relatedItems>
+                </resource>
+            </metadata>
+        </record>
+        <record>
+            <metadata>
+                <resource xmlns="http://datacite.org/schema/kernel-4">
+                    <identifier identifierType="DOI">10.12345/2</identifier>
+                </resource>
+            </metadata>
+        </record>
+    </ListRecords>
+</OAI-PMH>
+'''
+    data = list(XMLParser().iter_parse(io.StringIO(xml)))
+
+    assert [item['identifiers'][0]['identifier'] for item in data] == ['10.12345/1', '10.12345/2']
+    assert data[0]['relatedItems'] == [{
+        'relatedItemType': 'Journal',
+        'relationType': 'IsPublishedIn',
+        'relatedItemIdentifier': '1234-5678',
+        'relatedItemIdentifierType': 'ISSN',
+        'number': '42',
+        'numberType': 'Article'
+    }]
+
+
+def test_parse_sizes_formats():
+    xml = '''<resource xmlns="http://datacite.org/schema/kernel-4">
+    <sizes><size>10 MB</size><size>20 pages</size></sizes>
+    <formats><format>application/pdf</format></formats>
+</resource>'''
+    data = XMLParser().parse(io.StringIO(xml))
+
+    assert data['size'] == '10 MB'
+    assert data['format'] == 'application/pdf'
+
+
+def get_point_xml(identifier, longitude):
+    return f'''<resource xmlns="http://datacite.org/schema/kernel-4">
+    <identifier identifierType="DOI">{identifier}</identifier>
+    <geoLocations><geoLocation><geoLocationPoint>
+        <pointLongitude>{longitude}</pointLongitude><pointLatitude>1</pointLatitude>
+    </geoLocationPoint></geoLocation></geoLocations>
+</resource>'''
+
+
+def test_iter_parse_invalid_record():
+    xml = '<collection>{}{}{}</collection>'.format(
+        get_point_xml('10.12345/1', '1.5'), get_point_xml('10.12345/2', ''), get_point_xml('10.12345/3', '2')
+    )
+    data = list(XMLParser().iter_parse(io.StringIO(xml)))
+
+    # the invalid record is yielded as exception, the following records are still parsed
+    assert len(data) == 3
+    assert isinstance(data[1], ValueError)
+    assert data[2]['identifiers'][0]['identifier'] == '10.12345/3'
+
+    with pytest.raises(ValueError):
+        XMLParser().parse(io.StringIO(get_point_xml('10.12345/2', 'east')))
+
+
+def test_import_xml(db):
+    resource = Resource.objects.get(id=resource_ids[0])
+    data = get_expected_data(export_resource(resource))
+
+    parsed_data = XMLParser().parse(io.StringIO(XMLRenderer().render(data)))
+    resource = import_resource(Resource.objects.get(id=resource_ids[0]), parsed_data)
+
+    assert get_expected_data(export_resource(Resource.objects.get(id=resource.id))) == data
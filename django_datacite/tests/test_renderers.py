@@ -0,0 +1,80 @@
+import io
+from xml.dom.minidom import parseString
+from xml.sax.saxutils import XMLGenerator
+
+import pytest
+
+from django_datacite.exports import export_resource
+from django_datacite.models import Resource
+from django_datacite.renderers import XMLRenderer
+
+resource_ids = [1, 2]
+
+data = {
+    'identifiers': [{'identifier': '10.12345/12345', 'identifierType': 'DOI'}],
+    'creators': [{
+        'name': 'Test & "Test" <Tester>',
+        'nameType': 'Personal',
+        'affiliations': [{'affiliation': 'Institute\tof\nTesting'}]
+    }],
+    'titles': [
+        {'title': 'Title with\r\nline breaks\rand > < & \' " characters'},
+        {'title': '', 'titleType': 'Subtitle'}
+    ],
+    'publicationYear': 2023,
+    'subjects': [{'subject': 'Subject', 'schemeURI': 'https://example.com/?a=1&b="2"\t\r\n'}],
+    'geoLocations': [{
+        'geoLocationPoint': {'pointLongitude': 12.5, 'pointLatitude': -1e-07}
+    }],
+    'descriptions': [{'description': '  leading and trailing whitespace  '}]
+}
+
+
+def render_minidom(data, collection=False):
+    # the former implementation of XMLRenderer.render
+    stream = io.StringIO()
+    renderer = XMLRenderer(stream)
+    renderer.xml = XMLGenerator(stream, 'utf-8')
+    if collection:
+        renderer.render_collection(data)
+    else:
+        renderer.render(data)
+    return parseString(stream.getvalue()).toprettyxml(indent='    ')
+
+
+@pytest.mark.parametrize('resource_id', resource_ids)
+def test_xml_renderer(db, resource_id):
+    resource_data = export_resource(Resource.objects.get(id=resource_id))
+    assert XMLRenderer().render(resource_data) == render_minidom(resource_data)
+
+
+def test_xml_renderer_escape():
+    assert XMLRenderer().render(data) == render_minidom(data)
+
+
+def test_xml_renderer_stream():
+    stream = io.StringIO()
+    assert XMLRenderer(stream).render(data) is None
+    assert stream.getvalue() == render_minidom(data)
+
+
+def test_xml_renderer_collection(db):
+    resources_data = [export_resource(resource) for resource in Resource.objects.all()]
+    xml = XMLRenderer().render_collection(resources_data)
+
+    dom = parseString(xml)
+    assert dom.documentElement.tagName == 'resources'
+    assert len(dom.getElementsByTagName('resource')) == len(resources_data)
+    assert xml == render_minidom(resources_data, collection=True)
+
+
+def test_xml_renderer_collection_chunks(db):
+    resources_data = [export_resource(resource) for resource in Resource.objects.all()]
+    chunks = list(XMLRenderer().iter_render_collection(resources_data))
+
+    assert len(chunks) == len(resources_data) + 1
+    assert ''.join(chunks) == XMLRenderer().render_collection(resources_data)
+
+
+def test_xml_renderer_collection_empty():
+    assert XMLRenderer().render_collection([]) == '<?xml version="1.0" ?>\n<resources/>\n'
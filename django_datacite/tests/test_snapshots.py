@@ -0,0 +1,132 @@
+import io
+
+import django
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_datacite.management.commands import datacite_snapshots
+from django_datacite.models import Resource, ResourceSnapshot
+from django_datacite.snapshots import get_stale_resource_ids, update_snapshots
+
+resource_id = 1
+
+
+def test_datacite_snapshots(db):
+    call_command('datacite_snapshots', processes=1)
+
+    assert ResourceSnapshot.objects.count() == Resource.objects.count()
+
+    snapshot = ResourceSnapshot.objects.get(resource_id=resource_id)
+    assert snapshot.identifier == '10.12345/12345'
+    assert snapshot.json
+    assert snapshot.xml
+    assert snapshot.bibtex
+    assert snapshot.citation
+
+
+def test_datacite_snapshots_processes(db, monkeypatch):
+    executors = []
+
+    class Executor:
+        # runs the chunks in this process, a process pool would not see the test database
+        def __init__(self, max_workers, initializer=None):
+            executors.append((max_workers, initializer))
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def map(self, func, *iterables):
+            return map(func, *iterables)
+
+    monkeypatch.setattr(datacite_snapshots, 'ProcessPoolExecutor', Executor)
+    monkeypatch.setattr(datacite_snapshots.connections, 'close_all', lambda: None)
+
+    stdout = io.StringIO()
+    call_command('datacite_snapshots', processes=2, chunk_size=1, stdout=stdout)
+
+    assert executors == [(2, django.setup)]
+    assert stdout.getvalue() == f'{Resource.objects.count()} snapshots updated.\n'
+    assert ResourceSnapshot.objects.count() == Resource.objects.count()
+
+
+def test_update_snapshots_chunks(db, settings):
+    settings.DATACITE_EXPORT_CHUNK_SIZE = 1
+    resource_ids = list(Resource.objects.values_list('pk', flat=True))
+
+    with CaptureQueriesContext(connection) as context:
+        update_snapshots(resource_ids)
+
+    # one query per chunk and a last one, which finds no more resources
+    chunk_queries = [query for query in context
+                     if query['sql'].startswith('SELECT "datacite_resource"') and 'LIMIT 1' in query['sql']]
+    assert len(chunk_queries) == len(resource_ids) + 1
+    assert ResourceSnapshot.objects.count() == len(resource_ids)
+
+
+def test_snapshot_updated(db, settings, django_capture_on_commit_callbacks):
+    settings.DATACITE_SNAPSHOTS = True
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resource = Resource.objects.get(id=resource_id)
+        resource.version = '2.0'
+        resource.save()
+
+    snapshot = ResourceSnapshot.objects.get(resource_id=resource_id)
+    assert snapshot.revision == Resource.objects.get(id=resource_id).revision
+    assert 'Version 2.0' in snapshot.citation
+
+
+def test_snapshot_view(db, client, settings, django_assert_num_queries):
+    settings.DATACITE_SNAPSHOTS = True
+    call_command('datacite_snapshots', processes=1)
+    ResourceSnapshot.objects.filter(resource_id=resource_id).update(json='{"snapshot": true}')
+
+    url = reverse('datacite:resource_json', args=['10.12345/12345'])
+    client.get(url)  # populate the site cache of CurrentSiteMiddleware
+
+    # one query for the revision and one for the snapshot
+    with django_assert_num_queries(2):
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.json() == {'snapshot': True}
+
+
+def test_snapshot_view_stale(db, client, settings):
+    settings.DATACITE_SNAPSHOTS = True
+    call_command('datacite_snapshots', processes=1)
+    ResourceSnapshot.objects.filter(resource_id=resource_id).update(json='{"snapshot": true}', revision=1000)
+
+    response = client.get(reverse('datacite:resource_json', args=['10.12345/12345']))
+    assert response.status_code == 200
+    assert response.json() != {'snapshot': True}
+
+
+def test_snapshot_deferred(db, settings, django_capture_on_commit_callbacks):
+    settings.DATACITE_SNAPSHOTS = True
+    settings.DATACITE_SNAPSHOTS_DEFERRED = True
+    call_command('datacite_snapshots', processes=1)
+    assert not get_stale_resource_ids()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resource = Resource.objects.get(id=resource_id)
+        resource.version = '2.0'
+        resource.save()
+
+    # the snapshot is only marked as stale by the new revision
+    snapshot = ResourceSnapshot.objects.get(resource_id=resource_id)
+    assert snapshot.revision != Resource.objects.get(id=resource_id).revision
+    assert list(get_stale_resource_ids()) == [resource_id]
+
+    stdout = io.StringIO()
+    call_command('datacite_snapshots', processes=1, stale=True, stdout=stdout)
+
+    assert stdout.getvalue() == '1 snapshots updated.\n'
+    snapshot = ResourceSnapshot.objects.get(resource_id=resource_id)
+    assert snapshot.revision == Resource.objects.get(id=resource_id).revision
+    assert 'Version 2.0' in snapshot.citation
@@ -1,11 +1,40 @@
+import json
+from xml.dom.minidom import parseString
+
+import pytest
+
 from django.urls import reverse
 
+from django_datacite.models import Resource
+
 
 def test_resource(db, client):
     response = client.get(reverse('datacite:resource', args=['10.12345/12345']))
     assert response.status_code == 200
 
 
+@pytest.mark.parametrize('accept,content_type', [
+    ('text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8', 'text/html; charset=utf-8'),
+    ('*/*', 'text/html; charset=utf-8'),
+    ('application/vnd.datacite.datacite+json', 'application/vnd.datacite.datacite+json'),
+    ('application/vnd.datacite.datacite+xml', 'application/vnd.datacite.datacite+xml'),
+    ('application/x-bibtex, */*;q=0.1', 'application/x-bibtex'),
+    ('application/json;q=0.5, application/xml', 'application/xml'),
+    ('image/png', 'text/html; charset=utf-8'),
+])
+def test_resource_accept(db, client, accept, content_type):
+    response = client.get(reverse('datacite:resource', args=['10.12345/12345']), HTTP_ACCEPT=accept)
+    assert response.status_code == 200
+    assert response['Content-Type'] == content_type
+    assert 'Accept' in response['Vary'].split(', ')
+
+
+def test_resource_accept_error(db, client):
+    response = client.get(reverse('datacite:resource', args=['10.12345/00000']),
+                          HTTP_ACCEPT='application/vnd.datacite.datacite+json')
+    assert response.status_code == 404
+
+
 def test_resource_error(db, client):
     response = client.get(reverse('datacite:resource', args=['10.12345/00000']))
     assert response.status_code == 404
@@ -16,6 +45,19 @@ def test_resource_json(db, client):
     assert response.status_code == 200
 
 
+@pytest.mark.parametrize('header', ['ETag', 'Last-Modified'])
+def test_resource_json_not_modified(db, client, header):
+    url = reverse('datacite:resource_json', args=['10.12345/12345'])
+    response = client.get(url)
+    assert response.status_code == 200
+
+    if header == 'ETag':
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    else:
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+    assert response.status_code == 304
+
+
 def test_resource_json_error(db, client):
     response = client.get(reverse('datacite:resource_json', args=['10.12345/00000']))
     assert response.status_code == 404
@@ -26,6 +68,19 @@ def test_resource_xml(db, client):
     assert response.status_code == 200
 
 
+@pytest.mark.parametrize('header', ['ETag', 'Last-Modified'])
+def test_resource_xml_not_modified(db, client, header):
+    url = reverse('datacite:resource_xml', args=['10.12345/12345'])
+    response = client.get(url)
+    assert response.status_code == 200
+
+    if header == 'ETag':
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    else:
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+    assert response.status_code == 304
+
+
 def test_resource_xml_error(db, client):
     response = client.get(reverse('datacite:resource_xml', args=['10.12345/00000']))
     assert response.status_code == 404
@@ -36,6 +91,55 @@ def test_resource_bibtex(db, client):
     assert response.status_code == 200
 
 
+@pytest.mark.parametrize('header', ['ETag', 'Last-Modified'])
+def test_resource_bibtex_not_modified(db, client, header):
+    url = reverse('datacite:resource_bibtex', args=['10.12345/12345'])
+    response = client.get(url)
+    assert response.status_code == 200
+
+    if header == 'ETag':
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    else:
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+    assert response.status_code == 304
+
+
 def test_resource_bibtex_error(db, client):
     response = client.get(reverse('datacite:resource_bibtex', args=['10.12345/00000']))
     assert response.status_code == 404
+
+
+def test_resources_json(db, client):
+    response = client.get(reverse('datacite:resources_json'))
+    assert response.status_code == 200
+    assert response.streaming
+
+    data = json.loads(b''.join(response.streaming_content))
+    assert [item['identifiers'][0]['identifier'] for item in data] == ['10.12345/12345', '10.12345/99999']
+
+
+def test_resources_json_empty(db, client):
+    Resource.objects.update(public=False)
+
+    response = client.get(reverse('datacite:resources_json'))
+    assert response.status_code == 200
+    assert json.loads(b''.join(response.streaming_content)) == []
+
+
+def test_resources_ndjson(db, client):
+    response = client.get(reverse('datacite:resources_ndjson'))
+    assert response.status_code == 200
+    assert response.streaming
+
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    data = [json.loads(line) for line in lines]
+    assert [item['identifiers'][0]['identifier'] for item in data] == ['10.12345/12345', '10.12345/99999']
+
+
+def test_resources_xml(db, client):
+    response = client.get(reverse('datacite:resources_xml'))
+    assert response.status_code == 200
+    assert response.streaming
+
+    dom = parseString(b''.join(response.streaming_content))
+    assert len(dom.getElementsByTagName('resource')) == 2
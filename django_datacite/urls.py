@@ -1,10 +1,21 @@
 from django.urls import re_path
 
-from django_datacite.views import resource, resource_bibtex, resource_json, resource_xml
+from django_datacite.views import (
+    resource,
+    resource_bibtex,
+    resource_json,
+    resource_xml,
+    resources_json,
+    resources_ndjson,
+    resources_xml,
+)
 
 app_name = 'django_datacite'
 
 urlpatterns = [
+    re_path(r'^resources.json$', resources_json, name='resources_json'),
+    re_path(r'^resources.ndjson$', resources_ndjson, name='resources_ndjson'),
+    re_path(r'^resources.xml$', resources_xml, name='resources_xml'),
     re_path(r'^(?P<identifier>\d{2}\.\d+\/[A-Za-z0-9_.\-\/]+).xml$', resource_xml, name='resource_xml'),
     re_path(r'^(?P<identifier>\d{2}\.\d+\/[A-Za-z0-9_.\-\/]+).json$', resource_json, name='resource_json'),
     re_path(r'^(?P<identifier>\d{2}\.\d+\/[A-Za-z0-9_.\-\/]+).bib$', resource_bibtex, name='resource_bibtex'),
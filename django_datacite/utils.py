@@ -1,3 +1,4 @@
+import json
 import re
 
 from django.conf import settings
@@ -31,6 +32,48 @@ def render_bibtex(resource):
     return '\n'.join([line for line in bibtex.splitlines() if line.strip()])
 
 
+def render_json_lines(data):
+    # render an iterable of dicts as newline delimited JSON, one chunk per dict
+    for item in data:
+        yield json.dumps(item) + '\n'
+
+
+def render_json_array(data):
+    # render an iterable of dicts as one JSON array, one chunk per dict
+    yield '['
+    for index, item in enumerate(data):
+        yield (',\n' if index else '\n') + json.dumps(item)
+    yield '\n]\n'
+
+
+def get_accepted_media_type(accept, media_types):
+    # return the media type from media_types with the highest quality in the Accept header,
+    # the quality is taken from the most specific media range, ties are resolved by the order of media_types
+    media_ranges = {}
+    for media_range in accept.split(','):
+        media_range, *params = media_range.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_ranges[media_range.strip().lower()] = quality
+
+    accepted_media_type, accepted_quality = None, 0.0
+    for media_type in media_types:
+        main_type = media_type.split('/')[0]
+        for media_range in (media_type, f'{main_type}/*', '*/*'):
+            if media_range in media_ranges:
+                if media_ranges[media_range] > accepted_quality:
+                    accepted_media_type, accepted_quality = media_type, media_ranges[media_range]
+                break
+
+    return accepted_media_type
+
+
 def update_version(string):
     seperator = get_settings('DATACITE_VERSION_SEPERATOR')
     pattern = get_settings('DATACITE_VERSION_PATTERN')
@@ -1,17 +1,55 @@
-import json
-
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
 
-from .exports import export_resource
+from .cache import render_resource_bibtex, render_resource_json, render_resource_xml
+from .exports import export_resources
 from .models import Resource
 from .renderers import XMLRenderer
-from .utils import render_bibtex
+from .snapshots import get_snapshot
+from .utils import get_accepted_media_type, render_json_array, render_json_lines
+
+RESOURCE_MEDIA_TYPES = {
+    'text/html': 'html',
+    'application/vnd.datacite.datacite+json': 'json',
+    'application/json': 'json',
+    'application/vnd.datacite.datacite+xml': 'xml',
+    'application/xml': 'xml',
+    'application/x-bibtex': 'bibtex'
+}
+
+
+def get_resource(identifier):
+    # the relations are prefetched for the export, when a format is rendered
+    return Resource.objects.select_related('identifier').with_title() \
+                           .filter(public=True, identifier__identifier=identifier).first()
 
 
 def resource(request, identifier=None):
-    resource = Resource.objects.filter(public=True, identifier__identifier=identifier).first()
+    # content negotiation similar to https://citation.doi.org/docs.html
+    media_type = get_accepted_media_type(request.headers.get('Accept', '*/*'), RESOURCE_MEDIA_TYPES)
+    format = RESOURCE_MEDIA_TYPES.get(media_type, 'html')
+
+    if format == 'json':
+        response = resource_json(request, identifier)
+    elif format == 'xml':
+        response = resource_xml(request, identifier)
+    elif format == 'bibtex':
+        response = resource_bibtex(request, identifier)
+    else:
+        response = resource_html(request, identifier)
+
+    if format != 'html' and response.status_code == 200:
+        response['Content-Type'] = media_type
+
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def resource_html(request, identifier=None):
+    resource = get_resource(identifier)
 
     if resource:
         resource_url = reverse('django_datacite:resource', args=[resource.identifier.identifier])
@@ -29,10 +67,48 @@ def resource(request, identifier=None):
         raise Http404
 
 
+def get_resource_version(request, identifier):
+    # fetch only the fields needed for the conditional response headers, once per request
+    if not hasattr(request, 'datacite_resource_version'):
+        request.datacite_resource_version = Resource.objects.filter(public=True, identifier__identifier=identifier) \
+                                                            .values('pk', 'revision', 'modified_at').first()
+    return request.datacite_resource_version
+
+
+def get_resource_etag_func(format):
+    def resource_etag(request, identifier=None):
+        version = get_resource_version(request, identifier)
+        if version:
+            return '{}-{pk}-{revision}'.format(format, **version)
+    return resource_etag
+
+
+def resource_last_modified(request, identifier=None):
+    version = get_resource_version(request, identifier)
+    if version:
+        return version['modified_at']
+
+
+def get_resource_snapshot(request, identifier):
+    # use the stored snapshot, if it was created for the current revision of the resource
+    version = get_resource_version(request, identifier)
+    if version:
+        snapshot = get_snapshot(identifier)
+        if snapshot and snapshot.revision == version['revision']:
+            return snapshot
+
+
+@condition(etag_func=get_resource_etag_func('json'), last_modified_func=resource_last_modified)
 def resource_json(request, identifier=None):
-    resource = Resource.objects.filter(public=True, identifier__identifier=identifier).first()
+    snapshot = get_resource_snapshot(request, identifier)
+    if snapshot:
+        response = HttpResponse(snapshot.json, content_type="application/json")
+        response['Content-Disposition'] = f'filename="{snapshot.filename}.json"'
+        return response
+
+    resource = get_resource(identifier)
     if resource:
-        resource_json = json.dumps(export_resource(resource), indent=2)
+        resource_json = render_resource_json(resource)
         response = HttpResponse(resource_json, content_type="application/json")
         response['Content-Disposition'] = f'filename="{resource.identifier}.json"'
         return response
@@ -40,10 +116,17 @@ def resource_json(request, identifier=None):
         raise Http404
 
 
+@condition(etag_func=get_resource_etag_func('xml'), last_modified_func=resource_last_modified)
 def resource_xml(request, identifier=None):
-    resource = Resource.objects.filter(public=True, identifier__identifier=identifier).first()
+    snapshot = get_resource_snapshot(request, identifier)
+    if snapshot:
+        response = HttpResponse(snapshot.xml, content_type="application/xml")
+        response['Content-Disposition'] = f'filename="{snapshot.filename}.xml"'
+        return response
+
+    resource = get_resource(identifier)
     if resource:
-        resource_xml = XMLRenderer().render(export_resource(resource))
+        resource_xml = render_resource_xml(resource)
         response = HttpResponse(resource_xml, content_type="application/xml")
         response['Content-Disposition'] = f'filename="{resource.identifier}.xml"'
         return response
@@ -51,12 +134,40 @@ def resource_xml(request, identifier=None):
         raise Http404
 
 
+@condition(etag_func=get_resource_etag_func('bibtex'), last_modified_func=resource_last_modified)
 def resource_bibtex(request, identifier=None):
-    resource = Resource.objects.filter(public=True, identifier__identifier=identifier).first()
+    snapshot = get_resource_snapshot(request, identifier)
+    if snapshot:
+        response = HttpResponse(snapshot.bibtex, content_type='application/x-bibtex')
+        response['Content-Disposition'] = f'filename="{snapshot.filename}.bib"'
+        return response
+
+    resource = get_resource(identifier)
     if resource:
-        resource_bibtex = render_bibtex(resource)
+        resource_bibtex = render_resource_bibtex(resource)
         response = HttpResponse(resource_bibtex, content_type='application/x-bibtex')
         response['Content-Disposition'] = f'filename="{resource.identifier}.bib"'
         return response
     else:
         raise Http404
+
+
+def resources_json(request):
+    resources = export_resources(Resource.objects.filter(public=True))
+    response = StreamingHttpResponse(render_json_array(resources), content_type='application/json')
+    response['Content-Disposition'] = 'filename="resources.json"'
+    return response
+
+
+def resources_ndjson(request):
+    resources = export_resources(Resource.objects.filter(public=True))
+    response = StreamingHttpResponse(render_json_lines(resources), content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'filename="resources.ndjson"'
+    return response
+
+
+def resources_xml(request):
+    resources = export_resources(Resource.objects.filter(public=True))
+    response = StreamingHttpResponse(XMLRenderer().iter_render_collection(resources), content_type='application/xml')
+    response['Content-Disposition'] = 'filename="resources.xml"'
+    return response